@@ -1,92 +1,117 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response
+from flask import Flask, Response, stream_with_context, render_template, request, redirect, url_for, flash, jsonify, make_response
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-import qrcode
 import barcode
 from barcode.writer import ImageWriter
-from io import BytesIO
+from io import StringIO
 import base64
 from datetime import datetime, time, timedelta
-import uuid
-try:
-    from twilio.rest import Client
-except ImportError:
-    Client = None
+import time as time_module
+import threading
+import hmac
+import logging
 import csv
-from models import db, Admin, Staff, Student, Attendance, StaffAttendance
+import os
+import statistics
+from sqlalchemy import literal, select, union_all
+from models import (db, Admin, Staff, Student, Attendance, StaffAttendance,
+                    mark_attendance, insert_attendance_rows, upgrade_schema,
+                    attendance_percentage, attendance_counts, recent_staff_attendance, keyset_page,
+                    record_daily_marks, daily_summary, rebuild_daily_summary, unmarked_today)
+from barcode_index import BarcodeIndex
+from sms import SmsDispatcher
+from qr_cache import QRCache
+from badges import badge_people, badge_sheets
+from events import EventBroker, format_sse
+from importer import import_people
+from barcodes import BarcodeAllocator, normalize_barcode
+from auth import PrincipalCache
+from logs import configure_logging, request_fields
+from metrics import Metrics
+from query_stats import QueryStats
+from seed import seed_dataset
+from bench import run_benchmark, format_results, save_results
+from db_profile import configure_database, active_settings, without_timeouts
+import click
+from werkzeug.security import generate_password_hash, check_password_hash
 from config import Config
 
 
 app = Flask(__name__)
 app.config.from_object(Config)
+configure_logging(app)
+
+logger = logging.getLogger('attendance.app')
+auth_logger = logging.getLogger('attendance.auth')
+# Per-scan logs are sampled / rate limited (LOG_SCAN_SAMPLE_RATE, LOG_SCAN_MAX_PER_SECOND)
+scan_logger = logging.getLogger('attendance.scan')
 
 
 # Initialize extensions
+# Engine options (SQLite PRAGMAs / PostgreSQL pool) must be in place before init_app
+configure_database(app)
 db.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Logged-in users are cached between requests (see auth.py)
+principal_cache = PrincipalCache(app)
 
-# Initialize Twilio client safely
-twilio_client = None
-if Client and app.config.get('TWILIO_ACCOUNT_SID') and app.config.get('TWILIO_AUTH_TOKEN'):
-    try:
-        twilio_client = Client(app.config['TWILIO_ACCOUNT_SID'], app.config['TWILIO_AUTH_TOKEN'])
-        print("[INFO] Twilio client initialized successfully")
-    except Exception as e:
-        print(f"[WARNING] Twilio initialization failed: {e}")
+# Concurrent password verifications per worker, so a login rush leaves threads for scans
+password_check_slots = threading.BoundedSemaphore(app.config['PASSWORD_CHECK_CONCURRENCY'])
+
+# Barcode -> person lookups for the scan routes (see barcode_index.py)
+barcode_index = BarcodeIndex(os.path.join(app.instance_path, 'barcode_index.stamp'))
+
+# New barcodes come from a database sequence with a check symbol (see barcodes.py)
+barcode_allocator = BarcodeAllocator(app)
+
+
+# Rendered QR codes are cached on disk and in memory (see qr_cache.py)
+qr_cache = QRCache(app)
+
+# Request latency / status / scan counters, aggregated across workers (see metrics.py)
+metrics = Metrics(app)
+
+# SQL statement count and time per request, as headers in debug mode (see query_stats.py)
+query_stats = QueryStats(app)
+
+# Live dashboard events shared by all worker processes (see events.py)
+event_broker = EventBroker(app)
+
+# Outgoing SMS go through the SmsOutbox table and a background sender (see sms.py)
+sms_dispatcher = SmsDispatcher(app)
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    admin = Admin.query.get(int(user_id))
-    if admin:
-        return admin
-    return Staff.query.get(int(user_id))
+    # user_id is typed ('admin:1' / 'staff:42'); see auth.py
+    return principal_cache.load(user_id)
 
 
 def generate_barcode_string():
     """Generate unique barcode string"""
-    return str(uuid.uuid4())[:8].upper()
+    return barcode_allocator.allocate()[0]
 
 
 def create_qr_code(data):
-    """Generate QR code and return base64 encoded string"""
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(data)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    return img_str
+    """Return the (cached) QR code for data as a base64 encoded PNG string"""
+    _, png = qr_cache.get_png(data)
+    return base64.b64encode(png).decode()
 
 
 def send_sms_notification(phone_number, message):
-    """Send SMS notification using Twilio"""
-    if not twilio_client:
-        print("[WARNING] SMS skipped: Twilio not configured")
-        return False
-    
-    try:
-        twilio_client.messages.create(
-            body=message,
-            from_=app.config.get('TWILIO_PHONE_NUMBER'),
-            to=phone_number
-        )
-        print(f"[SUCCESS] SMS sent to {phone_number}")
-        return True
-    except Exception as e:
-        print(f"[ERROR] SMS failed: {e}")
-        return False
+    """Add an SMS notification to the outbox; the caller commits.
 
+    Delivery happens off the request path once sms_dispatcher.notify() is called.
+    """
+    return sms_dispatcher.queue(phone_number, message)
 
-def check_attendance_time():
-    """Check if current time is within attendance window"""
-    current_time = datetime.now().time()
+
+def check_attendance_time(current_time=None):
+    """Check if current time (or the given time of day) is within attendance window"""
+    if current_time is None:
+        current_time = datetime.now().time()
     start_time = time(9, 0)  # 9:00 AM
     end_time = time(9, 30)   # 9:30 AM
     late_time = time(10, 0)  # 10:00 AM
@@ -106,50 +131,45 @@ def index():
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    print("[INFO] Login route accessed")
-    
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         user_type = request.form.get('user_type')
         
-        print(f"[DEBUG] Form data received:")
-        print(f"   Username: '{username}'")
-        print(f"   Password: '{password}'")
-        print(f"   User Type: '{user_type}'")
-        
         if not username or not password or not user_type:
-            print("[ERROR] Missing form data!")
+            auth_logger.info("Login rejected: missing form data", extra=request_fields(user_type=user_type))
             flash('Please fill in all fields')
             return render_template('login.html')
         
         if user_type == 'admin':
             user = Admin.query.filter_by(username=username).first()
-            print(f"[DEBUG] Admin search result: {user is not None}")
         else:
             user = Staff.query.filter_by(name=username).first()
-            print(f"[DEBUG] Staff search result: {user is not None}")
         
         if user:
-            password_check = user.check_password(password)
-            print(f"[DEBUG] Password check result: {password_check}")
+            # Hash checks are deliberately slow; cap how many run at once
+            with password_check_slots:
+                password_check = user.check_password(password)
             
             if password_check:
+                if user.needs_rehash():
+                    # Stored with an older PASSWORD_HASH_METHOD; upgrade while we have the password
+                    user.set_password(password)
+                    db.session.commit()
                 login_user(user)
-                print(f"[SUCCESS] User logged in successfully! Redirecting...")
+                auth_logger.info("User logged in", extra=request_fields(user_type=user_type, user=username))
                 
                 if user_type == 'admin':
                     return redirect(url_for('admin_dashboard'))
                 else:
                     return redirect(url_for('staff_dashboard'))
             else:
-                print("[ERROR] Invalid password!")
+                auth_logger.warning("Login failed: invalid password", extra=request_fields(user_type=user_type, user=username))
                 flash('Invalid password')
         else:
-            print("[ERROR] User not found!")
+            auth_logger.warning("Login failed: unknown user", extra=request_fields(user_type=user_type, user=username))
             flash('User not found')
     
-    print("[INFO] Rendering login template")
     return render_template('login.html')
 
 
@@ -160,6 +180,28 @@ def logout():
     return redirect(url_for('login'))
 
 
+def student_list_page():
+    """The page of students selected by ?after=/?before= cursors, or None if a cursor is invalid"""
+    page_size = min(request.args.get('page_size', app.config['PAGE_SIZE'], type=int), app.config['MAX_PAGE_SIZE'])
+    try:
+        return keyset_page(
+            Student.query, Student,
+            after=request.args.get('after'), before=request.args.get('before'),
+            page_size=max(page_size, 1)
+        )
+    except ValueError:
+        flash('That page link is no longer valid')
+        return None
+
+
+def page_url(endpoint, after=None, before=None):
+    """Link to the neighbouring page, keeping the other query parameters"""
+    if not after and not before:
+        return None
+    args = {key: value for key, value in request.args.items() if key not in ('after', 'before')}
+    return url_for(endpoint, after=after, before=before, **args)
+
+
 @app.route('/admin_dashboard')
 @login_required
 def admin_dashboard():
@@ -169,7 +211,7 @@ def admin_dashboard():
     
     total_students = Student.query.count()
     total_staff = Staff.query.count()
-    today_attendance = Attendance.query.filter_by(date=datetime.now().date()).count()
+    today_attendance = daily_summary(datetime.now().date())['student']['marked']
     
     return render_template('admin_dashboard.html', 
                          total_students=total_students,
@@ -180,8 +222,13 @@ def admin_dashboard():
 @app.route('/staff_dashboard')
 @login_required
 def staff_dashboard():
-    students = Student.query.all()
-    return render_template('staff_dashboard.html', students=students)
+    page = student_list_page()
+    if page is None:
+        return redirect(url_for('staff_dashboard'))
+    return render_template('staff_dashboard.html',
+                         students=page.items,
+                         next_url=page_url('staff_dashboard', after=page.next_cursor),
+                         prev_url=page_url('staff_dashboard', before=page.prev_cursor))
 
 
 @app.route('/register_staff', methods=['GET', 'POST'])
@@ -196,11 +243,6 @@ def register_staff():
         department = request.form.get('department')
         password = request.form.get('password')
         
-        print(f"[DEBUG] Staff registration attempt:")
-        print(f"  Name: {name}")
-        print(f"  Department: {department}")
-        print(f"  Password: {'*' * len(password) if password else 'None'}")
-        
         if not name or not department or not password:
             flash('Please fill in all fields')
             return render_template('register_staff.html')
@@ -217,20 +259,22 @@ def register_staff():
             
             db.session.add(staff)
             db.session.commit()
+            barcode_index.add_person(staff)
             
             # Generate QR code
             qr_code = create_qr_code(barcode_str)
             
             flash('Staff registered successfully!')
-            print(f"[SUCCESS] Staff {name} registered with ID {staff.id}")
+            logger.info("Staff registered", extra=request_fields(staff_id=staff.id, department=department))
             
             return render_template('register_staff.html', 
                                  success=True, 
                                  barcode=barcode_str, 
                                  qr_code=qr_code,
+                                 qr_url=url_for('qr_png', code=barcode_str),
                                  staff_name=name)
         except Exception as e:
-            print(f"[ERROR] Staff registration failed: {e}")
+            logger.exception("Staff registration failed", extra=request_fields())
             flash(f'Registration failed: {str(e)}')
             return render_template('register_staff.html')
     
@@ -269,6 +313,7 @@ def register_student():
         
         db.session.add(student)
         db.session.commit()
+        barcode_index.add_person(student)
         
         # Generate QR code
         qr_code = create_qr_code(barcode_str)
@@ -278,11 +323,44 @@ def register_student():
                              success=True, 
                              barcode=barcode_str, 
                              qr_code=qr_code,
+                             qr_url=url_for('qr_png', code=barcode_str),
                              student_name=name)
     
     return render_template('register_student.html')
 
 
+@app.route('/import_people', methods=['POST'])
+@login_required
+def import_people_route():
+    """Bulk-register students or staff from an uploaded CSV file.
+
+    Students need name, reg_no, department and parent_phone columns; staff
+    need name, department and password (admin only). Returns a JSON report
+    with the number imported and an error per rejected line.
+    """
+    person_type = request.form.get('type', 'student')
+    if person_type not in ('student', 'staff'):
+        return jsonify({'status': 'error', 'message': 'type must be student or staff'}), 400
+    if person_type == 'staff' and not getattr(current_user, 'is_admin', False):
+        return jsonify({'status': 'error', 'message': 'Access denied - Admin only'}), 403
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'status': 'error', 'message': 'No CSV file uploaded'}), 400
+    
+    try:
+        stream = StringIO(upload.stream.read().decode('utf-8-sig'))
+    except UnicodeDecodeError:
+        return jsonify({'status': 'error', 'message': 'The CSV file must be UTF-8 encoded (in Excel, save as "CSV UTF-8")'}), 400
+    report = import_people(stream, barcode_allocator, person_type, chunk_size=app.config['IMPORT_CHUNK_SIZE'], on_inserted=barcode_index.add)
+    logger.info("CSV import finished", extra=request_fields(
+        person_type=person_type, imported=report['imported'], rejected=len(report['errors'])))
+    if not report['errors']:
+        status = 'success'
+    else:
+        status = 'partial' if report['imported'] else 'error'
+    return jsonify({'status': status, **report})
+
+
 @app.route('/student_details/<int:student_id>')
 @login_required
 def student_details(student_id):
@@ -331,15 +409,10 @@ def staff_attendance():
         flash('Access denied')
         return redirect(url_for('login'))
     
-    print("[INFO] Loading staff attendance page...")
-    
-    # Get all staff attendance records
+    # Last N attendance records of every staff member, in one windowed query
     staff_attendance_data = []
-    staff_members = Staff.query.all()
     
-    for staff in staff_members:
-        attendance_records = StaffAttendance.query.filter_by(staff_id=staff.id).order_by(StaffAttendance.date.desc()).limit(30).all()
-        
+    for staff, attendance_records in recent_staff_attendance(app.config['STAFF_HISTORY_DAYS']):
         # Calculate attendance percentage
         total_days = len(attendance_records)
         present_days = len([r for r in attendance_records if r.status in ['present', 'late']])
@@ -361,7 +434,6 @@ def staff_attendance():
 @login_required
 def student_attendance():
     """FIXED ROUTE: Student Attendance Reports - Redirect to All Students"""
-    print("[INFO] Student attendance page requested - redirecting to All Students")
     flash("📊 Viewing comprehensive student data in All Students page", 'info')
     return redirect(url_for('all_students'))
 
@@ -371,8 +443,6 @@ def student_attendance():
 @login_required
 def todays_students():
     """Show today's student attendance records"""
-    print("[INFO] Loading today's students attendance...")
-    
     today = datetime.now().date()
     
     # Get today's student attendance records
@@ -380,21 +450,28 @@ def todays_students():
         Attendance.date == today
     ).order_by(Attendance.time.desc()).all()
     
-    # Get students who haven't marked attendance yet
-    all_students = Student.query.all()
-    marked_student_ids = [record[0].student_id for record in todays_records]
-    absent_students = [student for student in all_students if student.id not in marked_student_ids]
+    # Students who haven't marked attendance yet, one page at a time
+    department = request.args.get('department') or None
+    absent_page = unmarked_today('student', today, department).paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=app.config['UNMARKED_PAGE_SIZE'],
+        error_out=False, count=False
+    )
+    absent_students = absent_page.items
     
-    # Calculate statistics
+    # Calculate statistics from the daily summary counters
+    counters = daily_summary(today)['student']
     total_students = Student.query.count()
-    present_count = len([r for r in todays_records if r[0].status == 'present'])
-    late_count = len([r for r in todays_records if r[0].status == 'late'])
-    absent_count = len(absent_students)
+    present_count = counters['present']
+    late_count = counters['late']
+    absent_count = total_students - counters['marked']
     attendance_rate = ((present_count + late_count) / total_students * 100) if total_students > 0 else 0
     
     return render_template('todays_students.html',
                          todays_records=todays_records,
                          absent_students=absent_students,
+                         absent_page=absent_page,
+                         department=department,
                          total_students=total_students,
                          present_count=present_count,
                          late_count=late_count,
@@ -411,8 +488,6 @@ def todays_staff():
         flash('Access denied - Admin only')
         return redirect(url_for('staff_dashboard'))
     
-    print("[INFO] Loading today's staff attendance...")
-    
     today = datetime.now().date()
     
     # Get today's staff attendance records
@@ -420,21 +495,28 @@ def todays_staff():
         StaffAttendance.date == today
     ).order_by(StaffAttendance.time.desc()).all()
     
-    # Get staff who haven't marked attendance yet
-    all_staff = Staff.query.all()
-    marked_staff_ids = [record[0].staff_id for record in todays_records]
-    absent_staff = [staff for staff in all_staff if staff.id not in marked_staff_ids]
+    # Staff who haven't marked attendance yet, one page at a time
+    department = request.args.get('department') or None
+    absent_page = unmarked_today('staff', today, department).paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=app.config['UNMARKED_PAGE_SIZE'],
+        error_out=False, count=False
+    )
+    absent_staff = absent_page.items
     
-    # Calculate statistics
+    # Calculate statistics from the daily summary counters
+    counters = daily_summary(today)['staff']
     total_staff = Staff.query.count()
-    present_count = len([r for r in todays_records if r[0].status == 'present'])
-    late_count = len([r for r in todays_records if r[0].status == 'late'])
-    absent_count = len(absent_staff)
+    present_count = counters['present']
+    late_count = counters['late']
+    absent_count = total_staff - counters['marked']
     attendance_rate = ((present_count + late_count) / total_staff * 100) if total_staff > 0 else 0
     
     return render_template('todays_staff.html',
                          todays_records=todays_records,
                          absent_staff=absent_staff,
+                         absent_page=absent_page,
+                         department=department,
                          total_staff=total_staff,
                          present_count=present_count,
                          late_count=late_count,
@@ -447,40 +529,23 @@ def todays_staff():
 @login_required
 def student_daily_report():
     """Generate today's student attendance report"""
-    print("[INFO] Generating student daily report...")
-    
     today = datetime.now().date()
     
-    # Get today's student attendance data
-    todays_records = db.session.query(Attendance, Student).join(Student).filter(
-        Attendance.date == today
-    ).order_by(Student.name).all()
-    
-    # Create CSV content
-    csv_lines = []
-    csv_lines.append('Student Name,Registration No,Department,Time,Status,Parent Phone')
-    
-    for attendance, student in todays_records:
-        line = f'"{student.name}","{student.reg_no}","{student.department}","{attendance.time.strftime("%H:%M:%S")}","{attendance.status}","{student.parent_phone or ""}"'
-        csv_lines.append(line)
-    
-    # Add absent students
-    all_students = Student.query.all()
-    marked_student_ids = [record[0].student_id for record in todays_records]
-    absent_students = [student for student in all_students if student.id not in marked_student_ids]
-    
-    for student in absent_students:
-        line = f'"{student.name}","{student.reg_no}","{student.department}","Not Marked","Absent","{student.parent_phone or ""}"'
-        csv_lines.append(line)
-    
-    csv_content = '\n'.join(csv_lines)
-    
-    # Create response
-    response = make_response(csv_content)
-    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    response.headers['Content-Disposition'] = f'attachment; filename=student_daily_report_{today.strftime("%Y%m%d")}.csv'
+    def report_rows():
+        # Today's student attendance data
+        todays_records = db.session.query(Attendance, Student).join(Student).filter(
+            Attendance.date == today
+        ).order_by(Student.name).yield_per(app.config['REPORT_YIELD_PER'])
+        for attendance, student in todays_records:
+            yield [student.name, student.reg_no, student.department,
+                   attendance.time.strftime("%H:%M:%S"), attendance.status, student.parent_phone or ""]
+        
+        # Students without a mark today, found by the database
+        for student in unmarked_today('student', today).yield_per(app.config['REPORT_YIELD_PER']):
+            yield [student.name, student.reg_no, student.department, "Not Marked", "Absent", student.parent_phone or ""]
     
-    return response
+    header = ['Student Name', 'Registration No', 'Department', 'Time', 'Status', 'Parent Phone']
+    return csv_response(stream_csv(header, report_rows()), f'student_daily_report_{today.strftime("%Y%m%d")}.csv')
 
 
 @app.route('/staff_daily_report')
@@ -491,47 +556,205 @@ def staff_daily_report():
         flash('Access denied - Admin only')
         return redirect(url_for('staff_dashboard'))
     
-    print("[INFO] Generating staff daily report...")
-    
     today = datetime.now().date()
     
-    # Get today's staff attendance data
-    todays_records = db.session.query(StaffAttendance, Staff).join(Staff).filter(
-        StaffAttendance.date == today
-    ).order_by(Staff.name).all()
-    
-    # Create CSV content
-    csv_lines = []
-    csv_lines.append('Staff Name,Department,Time,Status')
-    
-    for attendance, staff in todays_records:
-        line = f'"{staff.name}","{staff.department}","{attendance.time.strftime("%H:%M:%S")}","{attendance.status}"'
-        csv_lines.append(line)
-    
-    # Add absent staff
-    all_staff = Staff.query.all()
-    marked_staff_ids = [record[0].staff_id for record in todays_records]
-    absent_staff = [staff for staff in all_staff if staff.id not in marked_staff_ids]
-    
-    for staff in absent_staff:
-        line = f'"{staff.name}","{staff.department}","Not Marked","Absent"'
-        csv_lines.append(line)
+    def report_rows():
+        # Today's staff attendance data
+        todays_records = db.session.query(StaffAttendance, Staff).join(Staff).filter(
+            StaffAttendance.date == today
+        ).order_by(Staff.name).yield_per(app.config['REPORT_YIELD_PER'])
+        for attendance, staff in todays_records:
+            yield [staff.name, staff.department, attendance.time.strftime("%H:%M:%S"), attendance.status]
+        
+        # Staff without a mark today, found by the database
+        for staff in unmarked_today('staff', today).yield_per(app.config['REPORT_YIELD_PER']):
+            yield [staff.name, staff.department, "Not Marked", "Absent"]
     
-    csv_content = '\n'.join(csv_lines)
+    header = ['Staff Name', 'Department', 'Time', 'Status']
+    return csv_response(stream_csv(header, report_rows()), f'staff_daily_report_{today.strftime("%Y%m%d")}.csv')
+
+
+# Response styling for each attendance status, shared by the scan routes
+STATUS_CONFIG = {
+    'present': {
+        'emoji': '✅',
+        'icon': 'fas fa-check-circle',
+        'color': 'success',
+        'sound': 'success',
+        'title': 'Attendance Marked Successfully!'
+    },
+    'late': {
+        'emoji': '⚠️',
+        'icon': 'fas fa-exclamation-triangle', 
+        'color': 'warning',
+        'sound': 'warning',
+        'title': 'Marked as Late'
+    },
+    'absent': {
+        'emoji': '❌',
+        'icon': 'fas fa-times-circle',
+        'color': 'danger', 
+        'sound': 'error',
+        'title': 'Marked as Absent'
+    }
+}
+
+
+def person_not_found_payload():
+    return {
+        'status': 'error', 
+        'message': '❌ Invalid QR Code - Person not found in system',
+        'subtitle': 'Please ensure the QR code belongs to a registered student or staff member',
+        'icon': 'fas fa-user-slash',
+        'color': 'danger',
+        'sound': 'error'
+    }
+
+
+def already_marked_payload(person, existing_time, existing_status):
+    return {
+        'status': 'warning', 
+        'message': f'⚠️ Already Marked Today',
+        'subtitle': f'{person.name} ({person.person_type.title()}) attendance already recorded at {existing_time.strftime("%H:%M")}',
+        'person_name': person.name,
+        'person_type': person.person_type,
+        'already_marked': True,
+        'existing_time': existing_time.strftime("%H:%M"),
+        'existing_status': existing_status,
+        'icon': 'fas fa-clock',
+        'color': 'warning',
+        'sound': 'warning'
+    }
+
+
+def attendance_marked_payload(person, status, marked_date, marked_time, sms_queued):
+    config = STATUS_CONFIG.get(status, STATUS_CONFIG['present'])
+    return {
+        'status': 'success', 
+        'message': f'{config["emoji"]} {config["title"]}',
+        'subtitle': f'{person.name} ({person.person_type.title()}) - {status.upper()} at {marked_time.strftime("%H:%M")}',
+        'person_name': person.name,
+        'person_type': person.person_type,
+        'attendance_status': status,
+        'time': marked_time.strftime('%H:%M'),
+        'date': marked_date.strftime('%B %d, %Y'),
+        'sms_queued': sms_queued,
+        'icon': config['icon'],
+        'color': config['color'],
+        'sound': config['sound'],
+        'department': person.department or 'N/A',
+        'auto_close': True  # Auto close scanner after success
+    }
+
+
+def database_error_payload(error):
+    return {
+        'status': 'error',
+        'message': '❌ Database Error',
+        'subtitle': 'Failed to mark attendance. Please try again.',
+        'error_details': str(error),
+        'icon': 'fas fa-database',
+        'color': 'danger',
+        'sound': 'error'
+    }
+
+
+def parent_message(person, status, marked_time):
+    """The text for the parent of a late/absent student, or None if nobody is told"""
+    if person.person_type != 'student' or not person.parent_phone:
+        return None
+    if status == 'late':
+        return f"Dear Parent, {person.name} arrived late to school at {marked_time.strftime('%H:%M')}. Please ensure punctuality."
+    if status == 'absent':
+        return f"Dear Parent, {person.name} was marked absent today. Please contact school for details."
+    return None
+
+
+def notify_parent(person, status, marked_time):
+    """Queue a text to the parent of a late/absent student; returns True if queued"""
+    message = parent_message(person, status, marked_time)
+    if message is None:
+        return False
+    return send_sms_notification(person.parent_phone, message)
+
+
+@app.route('/qr/<code>.png')
+@login_required
+def qr_png(code):
+    """Serve a registered person's QR code as a cacheable PNG"""
+    if barcode_index.lookup(code) is None:
+        return jsonify({'status': 'error', 'message': 'Unknown barcode'}), 404
+    
+    etag, png = qr_cache.get_png(code)
+    response = make_response(png)
+    response.headers['Content-Type'] = 'image/png'
+    response.set_etag(etag)
+    # The image for a barcode never changes, so browsers may keep it for a year
+    response.cache_control.private = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+
+def parse_id_list(value):
+    """Parse '1,2, 3' into [1, 2, 3]; raises ValueError on junk"""
+    return [int(part) for part in (value or '').split(',') if part.strip()]
+
+
+BADGE_MIMETYPES = {'pdf': 'application/pdf', 'png': 'application/zip'}
+
+
+@app.route('/badges')
+@login_required
+def badge_sheet():
+    """Download print-ready badge sheets for a department or a list of ids"""
+    person_type = request.args.get('type', 'student')
+    fmt = request.args.get('format', 'pdf')
+    department = request.args.get('department')
     
-    # Create response
-    response = make_response(csv_content)
-    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    response.headers['Content-Disposition'] = f'attachment; filename=staff_daily_report_{today.strftime("%Y%m%d")}.csv'
+    if person_type == 'staff' and not getattr(current_user, 'is_admin', False):
+        flash('Access denied - Admin only')
+        return redirect(url_for('staff_dashboard'))
     
+    if person_type not in ('student', 'staff') or fmt not in BADGE_MIMETYPES:
+        return jsonify({'status': 'error', 'message': 'type must be student/staff and format pdf/png'}), 400
+    try:
+        ids = parse_id_list(request.args.get('ids'))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'ids must be a comma separated list of numbers'}), 400
+    
+    if not department and not ids:
+        # The whole school is a job for `flask badges`, not a web worker
+        return jsonify({'status': 'error', 'message': 'Choose a department or a list of ids'}), 400
+    
+    max_badges = app.config.get('BADGE_MAX_PER_REQUEST', 400)
+    people = badge_people(person_type, department=department, ids=ids, limit=max_badges + 1)
+    if not people:
+        return jsonify({'status': 'error', 'message': 'No matching people found'}), 404
+    if len(people) > max_badges:
+        return jsonify({
+            'status': 'error',
+            'message': f'Too many badges for one download (max {max_badges}); use `flask badges` instead'
+        }), 413
+    
+    logger.info("Rendering badges", extra=request_fields(person_type=person_type, count=len(people), format=fmt))
+    sheets = badge_sheets(
+        people, fmt=fmt,
+        columns=app.config['BADGE_COLUMNS'], rows=app.config['BADGE_ROWS'],
+        page_size=app.config['BADGE_PAGE_SIZE'], workers=app.config['BADGE_WORKERS']
+    )
+    extension = 'pdf' if fmt == 'pdf' else 'zip'
+    response = Response(metrics.streamed(sheets), mimetype=BADGE_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={person_type}_badges_{datetime.now().strftime("%Y%m%d")}.{extension}'
     return response
 
 
 @app.route('/scan_barcode', methods=['POST'])
 def scan_barcode():
     """Enhanced QR scanner route for both students and staff"""
-    data = request.get_json(silent=True) or {}
-    barcode_data = data.get('barcode')
+    data = request.get_json(silent=True)
+    # A JSON array or scalar carries no barcode either
+    barcode_data = data.get('barcode') if isinstance(data, dict) else None
     
     if not barcode_data:
         return jsonify({
@@ -541,298 +764,487 @@ def scan_barcode():
             'color': 'danger'
         }), 400
     
-    print(f"[INFO] 🎯 QR code scan attempt: {barcode_data}")
+    # Reject misreads by their check symbol before touching the index or database
+    barcode_data = normalize_barcode(barcode_data)
+    # Resolve the barcode from the in-memory index (students win over staff)
+    person = barcode_index.lookup(barcode_data) if barcode_data else None
     
-    # Try to find student first, then staff
-    student = Student.query.filter_by(barcode=barcode_data).first()
-    staff = Staff.query.filter_by(barcode=barcode_data).first()
+    if person is None:
+        scan_logger.info("Scan not found", extra=request_fields(status='not_found'))
+        metrics.scan_outcome('not_found')
+        return jsonify(person_not_found_payload()), 404
     
-    person = None
-    person_type = None
+    person_type = person.person_type
     
-    if student:
-        person = student
-        person_type = 'student'
-        print(f"[INFO] 👨‍🎓 Student found: {student.name}")
-    elif staff:
-        person = staff
-        person_type = 'staff'
-        print(f"[INFO] 👨‍💼 Staff found: {staff.name}")
-    else:
-        print(f"[ERROR] ❌ No person found for QR code: {barcode_data}")
-        return jsonify({
-            'status': 'error', 
-            'message': '❌ Invalid QR Code - Person not found in system',
-            'subtitle': 'Please ensure the QR code belongs to a registered student or staff member',
-            'icon': 'fas fa-user-slash',
-            'color': 'danger',
-            'sound': 'error'
-        }), 404
-    
-    # Check if already marked today
+    # Mark attendance unless already marked today (one INSERT ... ON CONFLICT)
     today = datetime.now().date()
-    
-    if person_type == 'student':
-        existing_attendance = Attendance.query.filter_by(
-            student_id=person.id, 
-            date=today
-        ).first()
-        attendance_model = Attendance
-        person_id_field = 'student_id'
-    else:  # staff
-        existing_attendance = StaffAttendance.query.filter_by(
-            staff_id=person.id, 
-            date=today
-        ).first()
-        attendance_model = StaffAttendance
-        person_id_field = 'staff_id'
-    
-    if existing_attendance:
-        return jsonify({
-            'status': 'warning', 
-            'message': f'⚠️ Already Marked Today',
-            'subtitle': f'{person.name} ({person_type.title()}) attendance already recorded at {existing_attendance.time.strftime("%H:%M")}',
-            'person_name': person.name,
-            'person_type': person_type,
-            'already_marked': True,
-            'existing_time': existing_attendance.time.strftime("%H:%M"),
-            'existing_status': existing_attendance.status,
-            'icon': 'fas fa-clock',
-            'color': 'warning',
-            'sound': 'warning'
-        }), 200
+    attendance_model = Attendance if person_type == 'student' else StaffAttendance
     
     # Determine attendance status based on time
     status = check_attendance_time()
     current_time = datetime.now().time()
     
-    # Create attendance record
-    attendance_data = {
-        person_id_field: person.id,
-        'date': today,
-        'time': current_time,
-        'status': status
+    try:
+        attendance_record, created = mark_attendance(attendance_model, person.id, today, current_time, status)
+        if created:
+            record_daily_marks([(today, person_type, person.department, status)])
+        # Queue SMS notification for students (if parent phone available)
+        sms_queued = created and notify_parent(person, status, current_time)
+        db.session.commit()
+    except Exception as e:
+        scan_logger.exception("Failed to mark attendance", extra=request_fields(person_type=person_type))
+        metrics.scan_outcome('error')
+        db.session.rollback()
+        return jsonify(database_error_payload(e)), 500
+    
+    if not created:
+        scan_logger.info("Scan already marked", extra=request_fields(person_type=person_type, person_id=person.id, status='already_marked'))
+        metrics.scan_outcome('already_marked')
+        return jsonify(already_marked_payload(person, attendance_record.time, attendance_record.status)), 200
+    
+    scan_logger.info("Attendance marked", extra=request_fields(person_type=person_type, person_id=person.id, status=status))
+    metrics.scan_outcome(status)
+    publish_scan_event(person, status, today, current_time)
+    if sms_queued:
+        sms_dispatcher.notify()
+    
+    return jsonify(attendance_marked_payload(person, status, today, current_time, sms_queued)), 201
+
+
+def parse_scan_timestamp(value):
+    """Parse a client ISO-8601 timestamp into naive local time (None -> now)"""
+    if value in (None, ''):
+        return datetime.now()
+    scanned_at = datetime.fromisoformat(str(value))
+    if scanned_at.tzinfo is not None:
+        scanned_at = scanned_at.astimezone().replace(tzinfo=None)
+    return scanned_at
+
+
+def existing_attendance_for(student_ids, staff_ids, dates):
+    """Fetch already-recorded attendance for the given people/dates in one query.
+
+    Returns {(person_type, person_id, date): (time, status)}.
+    """
+    selects = []
+    if student_ids:
+        selects.append(select(
+            literal('student').label('person_type'), Attendance.student_id.label('person_id'),
+            Attendance.date, Attendance.time, Attendance.status
+        ).where(Attendance.student_id.in_(student_ids), Attendance.date.in_(dates)))
+    if staff_ids:
+        selects.append(select(
+            literal('staff').label('person_type'), StaffAttendance.staff_id.label('person_id'),
+            StaffAttendance.date, StaffAttendance.time, StaffAttendance.status
+        ).where(StaffAttendance.staff_id.in_(staff_ids), StaffAttendance.date.in_(dates)))
+    if not selects:
+        return {}
+    query = union_all(*selects) if len(selects) > 1 else selects[0]
+    return {
+        (row.person_type, row.person_id, row.date): (row.time, row.status)
+        for row in db.session.execute(query)
     }
+
+
+# Reader clocks drift; scans this far ahead of the server clock are still accepted
+SCAN_CLOCK_SKEW = timedelta(minutes=2)
+
+# Scan outcome counted for each batch item HTTP status (201 uses the marked status)
+BATCH_OUTCOMES = {200: 'already_marked', 404: 'not_found', 500: 'error'}
+
+
+@app.route('/scan_barcode/batch', methods=['POST'])
+def scan_barcode_batch():
+    """Ingest a buffered burst of scans from a gate reader or kiosk.
+
+    Expects ``{"scans": [{"barcode": "...", "scanned_at": "<ISO-8601>"}, ...]}``
+    and returns one result per scan, in request order, carrying the same payload
+    /scan_barcode would have returned plus its ``http_status``.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({
+            'status': 'error',
+            'message': '❌ Expected a JSON object with a "scans" list',
+            'icon': 'fas fa-exclamation-circle',
+            'color': 'danger'
+        }), 400
+    scans = data.get('scans')
     
-    attendance_record = attendance_model(**attendance_data)
+    if not isinstance(scans, list) or not scans:
+        return jsonify({
+            'status': 'error', 
+            'message': '❌ No scans received',
+            'icon': 'fas fa-exclamation-circle',
+            'color': 'danger'
+        }), 400
+    
+    max_items = app.config.get('SCAN_BATCH_MAX_ITEMS', 500)
+    if len(scans) > max_items:
+        return jsonify({
+            'status': 'error',
+            'message': f'❌ Too many scans in one batch (max {max_items})',
+            'icon': 'fas fa-exclamation-circle',
+            'color': 'danger'
+        }), 413
+    
+    results = [None] * len(scans)
+    pending = []  # (index, barcode, scanned_at)
+    received_at = datetime.now()
+    oldest_scan = received_at - timedelta(seconds=app.config.get('SCAN_BATCH_MAX_AGE', 86400))
+    
+    for index, scan in enumerate(scans):
+        if not isinstance(scan, dict):
+            results[index] = ({
+                'status': 'error',
+                'message': '❌ Each scan must be an object with a barcode',
+                'icon': 'fas fa-exclamation-circle',
+                'color': 'danger'
+            }, 400)
+            continue
+        barcode_data = scan.get('barcode')
+        if not barcode_data:
+            results[index] = ({
+                'status': 'error', 
+                'message': '❌ No QR code data received',
+                'icon': 'fas fa-exclamation-circle',
+                'color': 'danger'
+            }, 400)
+            continue
+        try:
+            scanned_at = parse_scan_timestamp(scan.get('scanned_at'))
+        except (TypeError, ValueError):
+            results[index] = ({
+                'status': 'error',
+                'message': '❌ Invalid scan timestamp',
+                'icon': 'fas fa-exclamation-circle',
+                'color': 'danger'
+            }, 400)
+            continue
+        if scanned_at > received_at + SCAN_CLOCK_SKEW or scanned_at < oldest_scan:
+            # Future or long-stale scans would back-date marks, summaries and parent SMS
+            results[index] = ({
+                'status': 'error',
+                'message': '❌ Scan timestamp is outside the accepted range',
+                'icon': 'fas fa-exclamation-circle',
+                'color': 'danger'
+            }, 400)
+            continue
+        barcode_data = normalize_barcode(barcode_data)
+        if barcode_data is None:
+            results[index] = (person_not_found_payload(), 404)
+            continue
+        pending.append((index, barcode_data, scanned_at))
+    
+    # Resolve every barcode at once (index hits, then one query for the misses)
+    people = barcode_index.lookup_many([barcode_data for _, barcode_data, _ in pending])
+    
+    resolved = []
+    for index, barcode_data, scanned_at in pending:
+        person = people.get(barcode_data)
+        if person is None:
+            results[index] = (person_not_found_payload(), 404)
+        else:
+            resolved.append((index, person, scanned_at))
+    
+    existing = existing_attendance_for(
+        {person.id for _, person, _ in resolved if person.person_type == 'student'},
+        {person.id for _, person, _ in resolved if person.person_type == 'staff'},
+        {scanned_at.date() for _, _, scanned_at in resolved}
+    )
+    
+    # Earliest scan wins when the same person appears twice in one batch
+    new_marks = []
+    for index, person, scanned_at in sorted(resolved, key=lambda item: item[2]):
+        key = (person.person_type, person.id, scanned_at.date())
+        if key in existing:
+            existing_time, existing_status = existing[key]
+            results[index] = (already_marked_payload(person, existing_time, existing_status), 200)
+            continue
+        status = check_attendance_time(scanned_at.time())
+        existing[key] = (scanned_at.time(), status)
+        new_marks.append((index, person, scanned_at, status))
+    
+    student_rows = [
+        {'student_id': person.id, 'date': scanned_at.date(), 'time': scanned_at.time(), 'status': status}
+        for _, person, scanned_at, status in new_marks if person.person_type == 'student'
+    ]
+    staff_rows = [
+        {'staff_id': person.id, 'date': scanned_at.date(), 'time': scanned_at.time(), 'status': status}
+        for _, person, scanned_at, status in new_marks if person.person_type == 'staff'
+    ]
     
     try:
-        db.session.add(attendance_record)
-        db.session.commit()
-        print(f"[SUCCESS] ✅ Attendance marked for {person.name} ({person_type}) - Status: {status}")
-        
-        # Send SMS notification for students (if parent phone available)
-        sms_sent = False
-        if person_type == 'student' and hasattr(person, 'parent_phone') and person.parent_phone:
-            if status in ['late', 'absent']:
-                if status == 'late':
-                    message = f"Dear Parent, {person.name} arrived late to school at {current_time.strftime('%H:%M')}. Please ensure punctuality."
-                else:
-                    message = f"Dear Parent, {person.name} was marked absent today. Please contact school for details."
-                
-                sms_sent = send_sms_notification(person.parent_phone, message)
-        
-        # Prepare success response with enhanced data
-        status_config = {
-            'present': {
-                'emoji': '✅',
-                'icon': 'fas fa-check-circle',
-                'color': 'success',
-                'sound': 'success',
-                'title': 'Attendance Marked Successfully!'
-            },
-            'late': {
-                'emoji': '⚠️',
-                'icon': 'fas fa-exclamation-triangle', 
-                'color': 'warning',
-                'sound': 'warning',
-                'title': 'Marked as Late'
-            },
-            'absent': {
-                'emoji': '❌',
-                'icon': 'fas fa-times-circle',
-                'color': 'danger', 
-                'sound': 'error',
-                'title': 'Marked as Absent'
-            }
+        inserted = {
+            ('student', person_id, date) for person_id, date in insert_attendance_rows(Attendance, student_rows)
+        } | {
+            ('staff', person_id, date) for person_id, date in insert_attendance_rows(StaffAttendance, staff_rows)
         }
-        
-        config = status_config.get(status, status_config['present'])
-        
-        return jsonify({
-            'status': 'success', 
-            'message': f'{config["emoji"]} {config["title"]}',
-            'subtitle': f'{person.name} ({person_type.title()}) - {status.upper()} at {current_time.strftime("%H:%M")}',
-            'person_name': person.name,
-            'person_type': person_type,
-            'attendance_status': status,
-            'time': current_time.strftime('%H:%M'),
-            'date': today.strftime('%B %d, %Y'),
-            'sms_sent': sms_sent,
-            'icon': config['icon'],
-            'color': config['color'],
-            'sound': config['sound'],
-            'department': person.department if hasattr(person, 'department') else 'N/A',
-            'auto_close': True  # Auto close scanner after success
-        }), 201
-        
+        record_daily_marks(
+            (scanned_at.date(), person.person_type, person.department, status)
+            for _, person, scanned_at, status in new_marks
+            if (person.person_type, person.id, scanned_at.date()) in inserted
+        )
+        # Every parent text of the batch goes into the outbox with one insert
+        texts = [
+            (index, person.parent_phone, parent_message(person, status, scanned_at.time()))
+            for index, person, scanned_at, status in new_marks
+            if (person.person_type, person.id, scanned_at.date()) in inserted
+        ]
+        sms_queued = dict.fromkeys((index for index, _, _ in texts), False)
+        texts = [(index, phone, message) for index, phone, message in texts if message is not None]
+        queued = sms_dispatcher.queue_many([(phone, message) for _, phone, message in texts])
+        sms_queued.update(zip((index for index, _, _ in texts), queued))
+        db.session.commit()
     except Exception as e:
-        print(f"[ERROR] ❌ Failed to mark attendance: {e}")
+        scan_logger.exception("Failed to store batch attendance", extra=request_fields(received=len(scans)))
         db.session.rollback()
-        return jsonify({
-            'status': 'error',
-            'message': '❌ Database Error',
-            'subtitle': 'Failed to mark attendance. Please try again.',
-            'error_details': str(e),
-            'icon': 'fas fa-database',
-            'color': 'danger',
-            'sound': 'error'
-        }), 500
+        for index, _, _, _ in new_marks:
+            results[index] = (database_error_payload(e), 500)
+        new_marks = []
+        inserted = set()
+        sms_queued = {}
+    
+    if any(sms_queued.values()):
+        sms_dispatcher.notify()
+    
+    # Rows another worker inserted between our check and our insert
+    lost = [mark for mark in new_marks if (mark[1].person_type, mark[1].id, mark[2].date()) not in inserted]
+    if lost:
+        existing = existing_attendance_for(
+            {person.id for _, person, _, _ in lost if person.person_type == 'student'},
+            {person.id for _, person, _, _ in lost if person.person_type == 'staff'},
+            {scanned_at.date() for _, _, scanned_at, _ in lost}
+        )
+    
+    for index, person, scanned_at, status in new_marks:
+        key = (person.person_type, person.id, scanned_at.date())
+        if key not in inserted:
+            existing_time, existing_status = existing[key]
+            results[index] = (already_marked_payload(person, existing_time, existing_status), 200)
+            continue
+        results[index] = (attendance_marked_payload(person, status, scanned_at.date(), scanned_at.time(), sms_queued[index]), 201)
+        publish_scan_event(person, status, scanned_at.date(), scanned_at.time())
+    
+    scan_logger.info("Batch scan stored", extra=request_fields(received=len(scans), marked=len(inserted)))
+    
+    items = []
+    for payload, http_status in results:
+        payload['http_status'] = http_status
+        items.append(payload)
+        if http_status != 400:
+            metrics.scan_outcome(BATCH_OUTCOMES.get(http_status) or payload['attendance_status'])
+    
+    summary = {}
+    for payload in items:
+        summary[payload['status']] = summary.get(payload['status'], 0) + 1
+    
+    return jsonify({'status': 'success', 'received': len(scans), 'summary': summary, 'results': items}), 200
 
 
 @app.route('/scan_staff_barcode', methods=['POST'])
 def scan_staff_barcode():
     """Specific route for staff barcode scanning from staff attendance page"""
-    data = request.get_json(silent=True) or {}
-    barcode_data = data.get('barcode')
+    data = request.get_json(silent=True)
+    # A JSON array or scalar carries no barcode either
+    barcode_data = data.get('barcode') if isinstance(data, dict) else None
     
     if not barcode_data:
         return jsonify({'status': 'error', 'message': 'No barcode data received'}), 400
     
-    print(f"[INFO] Staff barcode scan attempt: {barcode_data}")
-    
-    # Find staff by barcode
-    staff = Staff.query.filter_by(barcode=barcode_data).first()
+    # Find staff by barcode, rejecting misreads before any lookup
+    barcode_data = normalize_barcode(barcode_data)
+    staff = barcode_index.lookup(barcode_data) if barcode_data else None
     
-    if not staff:
-        print(f"[ERROR] Staff not found for barcode: {barcode_data}")
+    if staff is None or staff.person_type != 'staff':
+        scan_logger.info("Staff scan not found", extra=request_fields(person_type='staff', status='not_found'))
+        metrics.scan_outcome('not_found')
         return jsonify({'status': 'error', 'message': 'Invalid staff barcode'}), 404
     
-    # Check if already marked today
+    # Mark attendance unless already marked today
     today = datetime.now().date()
-    existing_attendance = StaffAttendance.query.filter_by(
-        staff_id=staff.id, 
-        date=today
-    ).first()
-    
-    if existing_attendance:
-        return jsonify({
-            'status': 'warning', 
-            'message': f'Attendance already marked for {staff.name} today at {existing_attendance.time.strftime("%H:%M")}'
-        }), 200
     
     # Determine attendance status based on time
     status = check_attendance_time()
     current_time = datetime.now().time()
     
-    # Create staff attendance record
-    attendance = StaffAttendance(
-        staff_id=staff.id,
-        date=today,
-        time=current_time,
-        status=status
-    )
-    
     try:
-        db.session.add(attendance)
+        attendance, created = mark_attendance(StaffAttendance, staff.id, today, current_time, status)
+        if created:
+            record_daily_marks([(today, 'staff', staff.department, status)])
         db.session.commit()
-        print(f"[SUCCESS] Staff attendance marked for {staff.name}")
-        
-        return jsonify({
-            'status': 'success', 
-            'message': f'Staff attendance marked for {staff.name} - Status: {status.upper()}',
-            'staff_name': staff.name,
-            'attendance_status': status,
-            'time': current_time.strftime('%H:%M')
-        }), 201
-        
-    except Exception as e:
-        print(f"[ERROR] Failed to mark staff attendance: {e}")
+    except Exception:
+        scan_logger.exception("Failed to mark staff attendance", extra=request_fields(person_type='staff'))
+        metrics.scan_outcome('error')
+        db.session.rollback()
         return jsonify({
             'status': 'error',
             'message': 'Failed to mark attendance'
         }), 500
+    
+    if not created:
+        scan_logger.info("Scan already marked", extra=request_fields(person_type='staff', person_id=staff.id, status='already_marked'))
+        metrics.scan_outcome('already_marked')
+        return jsonify({
+            'status': 'warning', 
+            'message': f'Attendance already marked for {staff.name} today at {attendance.time.strftime("%H:%M")}'
+        }), 200
+    
+    scan_logger.info("Attendance marked", extra=request_fields(person_type='staff', person_id=staff.id, status=status))
+    metrics.scan_outcome(status)
+    publish_scan_event(staff, status, today, current_time)
+    
+    return jsonify({
+        'status': 'success', 
+        'message': f'Staff attendance marked for {staff.name} - Status: {status.upper()}',
+        'staff_name': staff.name,
+        'attendance_status': status,
+        'time': current_time.strftime('%H:%M')
+    }), 201
+
+
+def stream_csv(header, rows, flush_bytes=16384):
+    """Yield CSV text in chunks as rows are produced, with proper escaping"""
+    buffer = StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= flush_bytes:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def csv_response(chunks, filename):
+    response = Response(stream_with_context(chunks), mimetype='text/csv')
+    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+def parse_report_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
 
 
 @app.route('/download_reports')
 @login_required
 def download_reports():
+    """Stream the attendance history as CSV.
+
+    Optional filters: ``from``/``to`` (YYYY-MM-DD, inclusive), ``department``
+    and ``type`` (student or staff).
+    """
     if not hasattr(current_user, 'is_admin') or not current_user.is_admin:
         flash('Access denied')
         return redirect(url_for('login'))
     
-    print("[INFO] Generating comprehensive attendance report...")
-    
-    # Create CSV content as string
-    csv_lines = []
-    csv_lines.append('Type,Name,ID/Reg No,Department,Date,Time,Status,Contact Phone')
-    
-    # Get student attendance data
-    student_records = db.session.query(Attendance, Student).join(Student).all()
-    for attendance, student in student_records:
-        line = f'"Student","{student.name}","{student.reg_no}","{student.department}","{attendance.date.strftime("%Y-%m-%d")}","{attendance.time.strftime("%H:%M:%S")}","{attendance.status}","{student.parent_phone}"'
-        csv_lines.append(line)
-    
-    # Get staff attendance data
-    staff_records = db.session.query(StaffAttendance, Staff).join(Staff).all()
-    for attendance, staff in staff_records:
-        line = f'"Staff","{staff.name}","{staff.id}","{staff.department}","{attendance.date.strftime("%Y-%m-%d")}","{attendance.time.strftime("%H:%M:%S")}","{attendance.status}","N/A"'
-        csv_lines.append(line)
-    
-    # Join all lines with newlines
-    csv_content = '\n'.join(csv_lines)
-    
-    # Create response
-    response = make_response(csv_content)
-    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    response.headers['Content-Disposition'] = f'attachment; filename=comprehensive_attendance_report_{datetime.now().strftime("%Y%m%d")}.csv'
-    
-    print("[SUCCESS] Comprehensive report generated successfully")
-    return response
+    try:
+        date_from = parse_report_date(request.args.get('from'))
+        date_to = parse_report_date(request.args.get('to'))
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format')
+        return redirect(url_for('admin_dashboard'))
+    department = request.args.get('department')
+    report_type = request.args.get('type')
+    if report_type not in (None, '', 'student', 'staff'):
+        # Otherwise no branch matches and the CSV looks like "no attendance"
+        flash('Report type must be student or staff')
+        return redirect(url_for('admin_dashboard'))
+    
+    def report_rows():
+        batch_size = app.config['REPORT_YIELD_PER']
+        
+        if report_type in (None, '', 'student'):
+            query = select(
+                Student.name, Student.reg_no, Student.department, Student.parent_phone,
+                Attendance.date, Attendance.time, Attendance.status
+            ).join(Student, Attendance.student_id == Student.id)
+            if date_from:
+                query = query.where(Attendance.date >= date_from)
+            if date_to:
+                query = query.where(Attendance.date <= date_to)
+            if department:
+                query = query.where(Student.department == department)
+            query = query.order_by(Attendance.date, Attendance.id).execution_options(yield_per=batch_size)
+            for row in db.session.execute(query):
+                yield ['Student', row.name, row.reg_no, row.department, row.date.strftime('%Y-%m-%d'),
+                       row.time.strftime('%H:%M:%S'), row.status, row.parent_phone]
+        
+        if report_type in (None, '', 'staff'):
+            query = select(
+                Staff.id, Staff.name, Staff.department,
+                StaffAttendance.date, StaffAttendance.time, StaffAttendance.status
+            ).join(Staff, StaffAttendance.staff_id == Staff.id)
+            if date_from:
+                query = query.where(StaffAttendance.date >= date_from)
+            if date_to:
+                query = query.where(StaffAttendance.date <= date_to)
+            if department:
+                query = query.where(Staff.department == department)
+            query = query.order_by(StaffAttendance.date, StaffAttendance.id).execution_options(yield_per=batch_size)
+            for row in db.session.execute(query):
+                yield ['Staff', row.name, row.id, row.department, row.date.strftime('%Y-%m-%d'),
+                       row.time.strftime('%H:%M:%S'), row.status, 'N/A']
+    
+    header = ['Type', 'Name', 'ID/Reg No', 'Department', 'Date', 'Time', 'Status', 'Contact Phone']
+    return csv_response(
+        stream_csv(header, report_rows()),
+        f'comprehensive_attendance_report_{datetime.now().strftime("%Y%m%d")}.csv'
+    )
 
 
 @app.route('/all_students')
 @login_required
 def all_students():
     # Allow both admin and staff to view students
-    students = Student.query.all()
+    page = student_list_page()
+    if page is None:
+        return redirect(url_for('all_students'))
     student_data = []
     
-    for student in students:
+    # One GROUP BY query for the page's totals instead of queries per student
+    counts = attendance_counts([student.id for student in page.items])
+    for student in page.items:
+        total_days, present_days = counts.get(student.id, (0, 0))
         student_data.append({
             'id': student.id,
             'name': student.name,
             'reg_no': student.reg_no,
             'department': student.department,
             'parent_phone': student.parent_phone,
-            'attendance_percentage': student.get_attendance_percentage(),
-            'total_days': len(student.attendance_records)
+            'attendance_percentage': attendance_percentage(total_days, present_days),
+            'total_days': total_days
         })
     
-    return render_template('all_students.html', students=student_data)
+    return render_template('all_students.html',
+                         students=student_data,
+                         next_url=page_url('all_students', after=page.next_cursor),
+                         prev_url=page_url('all_students', before=page.prev_cursor))
 
 
-@app.route('/attendance_statistics')
-@login_required
-def attendance_statistics():
-    """Get real-time attendance statistics for dashboard"""
+def attendance_snapshot():
+    """Today's student and staff counters, as served to the dashboards"""
     today = datetime.now().date()
     
+    counters = daily_summary(today)
+    
     # Student statistics
     total_students = Student.query.count()
-    students_present_today = Attendance.query.filter_by(date=today, status='present').count()
-    students_late_today = Attendance.query.filter_by(date=today, status='late').count()
-    students_marked_today = Attendance.query.filter_by(date=today).count()
+    students_present_today = counters['student']['present']
+    students_late_today = counters['student']['late']
+    students_marked_today = counters['student']['marked']
     students_absent_today = total_students - students_marked_today
     
     # Staff statistics
     total_staff = Staff.query.count()
-    staff_present_today = StaffAttendance.query.filter_by(date=today, status='present').count()
-    staff_late_today = StaffAttendance.query.filter_by(date=today, status='late').count()
-    staff_marked_today = StaffAttendance.query.filter_by(date=today).count()
+    staff_present_today = counters['staff']['present']
+    staff_late_today = counters['staff']['late']
+    staff_marked_today = counters['staff']['marked']
     staff_absent_today = total_staff - staff_marked_today
     
-    return jsonify({
+    return {
         'students': {
             'total': total_students,
             'present': students_present_today,
@@ -849,9 +1261,261 @@ def attendance_statistics():
         },
         'date': today.strftime('%Y-%m-%d'),
         'time': datetime.now().strftime('%H:%M:%S')
+    }
+
+
+@app.route('/attendance_statistics')
+@login_required
+def attendance_statistics():
+    """Get real-time attendance statistics for dashboard"""
+    return jsonify(attendance_snapshot())
+
+
+@app.route('/events/attendance')
+@login_required
+def attendance_events():
+    """Server-Sent Events feed: one 'scan' event per new mark plus periodic 'snapshot' counters.
+
+    Browsers reconnect automatically and resume from Last-Event-ID. Streams
+    end after EVENTS_STREAM_MAX_SECONDS so long-lived connections do not pin
+    a worker forever.
+    """
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = event_broker.last_id()
+    snapshot_interval = app.config['EVENTS_SNAPSHOT_INTERVAL']
+    max_seconds = app.config['EVENTS_STREAM_MAX_SECONDS']
+    
+    def stream():
+        nonlocal last_id
+        started = time_module.monotonic()
+        next_snapshot = started
+        last_sent = started
+        # Ask the browser to wait a few seconds before reconnecting
+        yield 'retry: 3000\n\n'
+        while time_module.monotonic() - started < max_seconds:
+            now = time_module.monotonic()
+            for event_id, event_type, payload in event_broker.read_since(last_id):
+                yield format_sse(payload, event=event_type, event_id=event_id)
+                last_id = event_id
+                last_sent = now
+            if now >= next_snapshot:
+                # Fresh app context per snapshot so no DB session stays open between
+                # polls; it is popped before the yield, never held across it
+                with app.app_context():
+                    snapshot = attendance_snapshot()
+                yield format_sse(snapshot, event='snapshot')
+                next_snapshot = now + snapshot_interval
+                last_sent = now
+            elif now - last_sent >= 15:
+                yield ': keepalive\n\n'
+                last_sent = now
+            time_module.sleep(event_broker.poll_interval)
+    
+    response = Response(metrics.streamed(stream()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
+
+def publish_scan_event(person, status, marked_date, marked_time):
+    event_broker.publish('scan', {
+        'person_name': person.name,
+        'person_type': person.person_type,
+        'department': person.department,
+        'status': status,
+        'date': marked_date.strftime('%Y-%m-%d'),
+        'time': marked_time.strftime('%H:%M:%S')
     })
 
 
+@app.route('/barcode_index/stats')
+@login_required
+def barcode_index_stats():
+    """Hit/miss counters for this worker's barcode index"""
+    if not hasattr(current_user, 'is_admin') or not current_user.is_admin:
+        return jsonify({'status': 'error', 'message': 'Access denied'}), 403
+    
+    return jsonify(barcode_index.stats())
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for admins, or for scrapers sending METRICS_TOKEN as a bearer token"""
+    token = app.config.get('METRICS_TOKEN')
+    authorized = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not (current_user.is_authenticated and getattr(current_user, 'is_admin', False)):
+        return jsonify({'status': 'error', 'message': 'Access denied - Admin only'}), 403
+    
+    body = metrics.render(gauges={
+        'sms_outbox_pending': ('SMS messages waiting in the outbox', sms_dispatcher.pending_count()),
+    })
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+@app.cli.command('rebuild-barcode-index')
+@without_timeouts
+def rebuild_barcode_index_command():
+    """Reload the barcode index after rows were changed outside the app"""
+    barcode_index.mark_stale()
+    count = barcode_index.load()
+    print(f"[SUCCESS] Barcode index rebuilt with {count} entries; running workers will reload on their next scan")
+
+
+@app.cli.command('upgrade-db')
+@click.option('--dry-run', is_flag=True, help='Only list the changes that would be made')
+@without_timeouts
+def upgrade_db_command(dry_run):
+    """Apply model constraints and indexes to an existing database"""
+    upgrade = upgrade_schema(dry_run=dry_run)
+    for table, count in upgrade.duplicates_removed.items():
+        if count and dry_run:
+            print(f"[WARNING] Would delete {count} duplicate row(s) from {table} (keeping the earliest mark per person and day)")
+        elif count:
+            print(f"[WARNING] Deleted {count} duplicate row(s) from {table} (kept the earliest mark per person and day)")
+    if upgrade.summary_rebuilt and dry_run:
+        print("[INFO] Would rebuild the daily attendance summary from the attendance tables")
+    elif upgrade.summary_rebuilt:
+        print("[SUCCESS] Rebuilt the daily attendance summary from the attendance tables")
+    if not upgrade.changed:
+        print("[INFO] Database schema already up to date")
+    elif dry_run:
+        print(f"[INFO] Would create indexes / widen columns: {', '.join(upgrade.changed)}")
+    else:
+        print(f"[SUCCESS] Created indexes / widened columns: {', '.join(upgrade.changed)}")
+
+
+@app.cli.command('drain-sms')
+def drain_sms_command():
+    """Send every due message in the SMS outbox"""
+    if sms_dispatcher.transport is None:
+        print("[WARNING] SMS skipped: no SMS transport configured")
+        return
+    sent = sms_dispatcher.drain_all()
+    print(f"[SUCCESS] Sent {sent} SMS digest(s); {sms_dispatcher.pending_count()} message(s) still pending")
+
+
+@app.cli.command('badges')
+@click.option('--type', 'person_type', type=click.Choice(['student', 'staff']), default='student')
+@click.option('--department', default=None, help='Only badges for this department')
+@click.option('--ids', default='', help='Comma separated ids')
+@click.option('--format', 'fmt', type=click.Choice(['pdf', 'png']), default='pdf')
+@click.option('--output', '-o', required=True, type=click.Path(dir_okay=False), help='File to write')
+@click.option('--workers', type=int, default=None, help='Render processes (default BADGE_WORKERS, 0 = one per CPU)')
+def badges_command(person_type, department, ids, fmt, output, workers):
+    """Render badge sheets (QR + Code128) to a PDF or a ZIP of PNG pages"""
+    people = badge_people(person_type, department=department, ids=parse_id_list(ids))
+    if not people:
+        print("[WARNING] No matching people found")
+        return
+    if workers is None:
+        workers = app.config['BADGE_WORKERS']
+    
+    sheets = badge_sheets(
+        people, fmt=fmt,
+        columns=app.config['BADGE_COLUMNS'], rows=app.config['BADGE_ROWS'],
+        # 0 means one process per CPU (badge_sheets' default)
+        page_size=app.config['BADGE_PAGE_SIZE'], workers=workers or None
+    )
+    with open(output, 'wb') as f:
+        for chunk in sheets:
+            f.write(chunk)
+    print(f"[SUCCESS] Wrote {len(people)} badges to {output}")
+
+
+@app.cli.command('rebuild-daily-summary')
+@click.option('--from', 'date_from', default=None, help='First date (YYYY-MM-DD), default today')
+@click.option('--to', 'date_to', default=None, help='Last date (YYYY-MM-DD), default --from')
+@without_timeouts
+def rebuild_daily_summary_command(date_from, date_to):
+    """Recompute the daily attendance counters for a date range"""
+    date_from = parse_report_date(date_from) or datetime.now().date()
+    date_to = parse_report_date(date_to) or date_from
+    rebuild_daily_summary(date_from, date_to)
+    print(f"[SUCCESS] Daily attendance summary rebuilt for {date_from} to {date_to}")
+
+
+@app.cli.command('import-people')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--type', 'person_type', type=click.Choice(['student', 'staff']), default='student')
+@click.option('--report', default=None, type=click.Path(dir_okay=False), help='Write rejected rows to this CSV file')
+@without_timeouts
+def import_people_command(csv_file, person_type, report):
+    """Bulk-register students or staff from a CSV file"""
+    try:
+        result = import_people(csv_file, barcode_allocator, person_type, chunk_size=app.config['IMPORT_CHUNK_SIZE'], on_inserted=barcode_index.add)
+    except UnicodeDecodeError:
+        raise click.ClickException(f'{csv_file.name} is not UTF-8 encoded; rows before the bad byte may already be imported. Save it as "CSV UTF-8" and import again')
+    finally:
+        # Running workers reload their barcode index on their next scan
+        barcode_index.mark_stale()
+    for error in result['errors']:
+        print(f"[WARNING] Line {error['line']}: {error['error']}")
+    if report and result['errors']:
+        with open(report, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['line', 'reg_no', 'error'])
+            writer.writeheader()
+            writer.writerows(result['errors'])
+    print(f"[SUCCESS] Imported {result['imported']} {person_type}(s), {len(result['errors'])} row(s) rejected")
+
+
+@app.cli.command('bench-password-hash')
+@click.option('--method', 'methods', multiple=True, help='werkzeug hash method to time (repeatable)')
+@click.option('--rounds', default=5, show_default=True, help='Hash/verify rounds per method')
+def bench_password_hash_command(methods, rounds):
+    """Time hashing and verification per password hash profile"""
+    methods = methods or (app.config['PASSWORD_HASH_METHOD'], 'scrypt:32768:8:1', 'scrypt:16384:8:1',
+                          'pbkdf2:sha256:600000', 'pbkdf2:sha256:260000')
+    print(f"{'method':<24} {'hash ms':>9} {'verify ms':>10} {'length':>7}")
+    for method in dict.fromkeys(methods):
+        hash_times, verify_times = [], []
+        for _ in range(rounds):
+            started = time_module.perf_counter()
+            hashed = generate_password_hash('bench-password', method=method)
+            hash_times.append((time_module.perf_counter() - started) * 1000)
+            started = time_module.perf_counter()
+            check_password_hash(hashed, 'bench-password')
+            verify_times.append((time_module.perf_counter() - started) * 1000)
+        print(f"{method:<24} {statistics.median(hash_times):>9.1f} {statistics.median(verify_times):>10.1f} {len(hashed):>7}")
+    print(f"[INFO] Current PASSWORD_HASH_METHOD: {app.config['PASSWORD_HASH_METHOD']}")
+
+
+@app.cli.command('seed')
+@click.option('--students', default=20000, show_default=True, help='Students to generate')
+@click.option('--staff', default=500, show_default=True, help='Staff to generate')
+@click.option('--days', default=730, show_default=True, help='Days of attendance history before today')
+@click.option('--random-seed', default=42, show_default=True, help='Seed for repeatable data')
+@without_timeouts
+def seed_command(students, staff, days, random_seed):
+    """Fill the database with synthetic people and attendance history"""
+    db.create_all()
+    started = time_module.perf_counter()
+    seed_dataset(barcode_allocator, check_attendance_time, students=students, staff=staff, days=days, random_seed=random_seed)
+    barcode_index.mark_stale()
+    print(f"[SUCCESS] Seeded {students} students, {staff} staff and {days} days in {time_module.perf_counter() - started:.1f}s")
+
+
+@app.cli.command('bench')
+@click.option('--iterations', default=20, show_default=True, help='Requests per route')
+@click.option('--output', '-o', default=None, type=click.Path(dir_okay=False), help='Write results as JSON')
+@click.option('--username', default='admin', show_default=True)
+@click.option('--password', default='admin123', show_default=True)
+def bench_command(iterations, output, username, password):
+    """Time every route (p50/p95/p99, query counts) through the test client"""
+    results = run_benchmark(app, iterations=iterations, username=username, password=password)
+    print(format_results(results))
+    if output:
+        save_results(results, output)
+        print(f"[SUCCESS] Results written to {output}")
+
+
+@app.cli.command('db-profile')
+def db_profile_command():
+    """Show the database settings actually in effect"""
+    for name, value in active_settings(db.session).items():
+        print(f"{name:<20} {value}")
+
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -866,31 +1530,20 @@ def internal_error(error):
 
 if __name__ == '__main__':
     with app.app_context():
-        print("[INFO] 🚀 Initializing enhanced attendance management system...")
+        logger.info("Initializing attendance management system")
         db.create_all()
         
         # Create default admin if not exists
         admin = Admin.query.filter_by(username='admin').first()
         if not admin:
-            print("[SETUP] 👤 Creating default admin user...")
             admin = Admin(username='admin')
             admin.set_password('admin123')
             admin.is_admin = True
             db.session.add(admin)
             db.session.commit()
-            print("[SUCCESS] ✅ Default admin created: username=admin, password=admin123")
-        else:
-            print("[INFO] ℹ️ Default admin already exists")
-    
-    print("[STARTUP] 🎯 Starting ENHANCED attendance system with TODAY'S FEATURES...")
-    print("[INFO] 📷 Real-time QR scanner with proper camera shutdown")
-    print("[INFO] 🎨 Enhanced login page with modern design")
-    print("[INFO] 📊 Student attendance reports FIXED - redirects to All Students")
-    print("[INFO] 🔄 Fixed navigation back to dashboard")
-    print("[INFO] ✨ NEW: Today's Students feature enabled")
-    print("[INFO] ⭐ NEW: Today's Staff feature enabled")
-    print("[INFO] 📥 NEW: Daily reports download enabled")
-    print("[INFO] 🌐 Access your app at: http://127.0.0.1:5000")
-    print("[INFO] 🔐 Admin login: admin / admin123")
-    print("[SUCCESS] ✅ ALL FEATURES WORKING - Quick Actions fully enabled!")
+            logger.warning("Default admin created: username=admin, password=admin123 - change it")
+        
+        logger.info("Barcode index loaded", extra={'entries': barcode_index.load()})
+    
+    logger.info("Starting attendance system at http://127.0.0.1:5000")
     app.run(debug=True, host='127.0.0.1', port=5000)
@@ -0,0 +1,217 @@
+import multiprocessing
+import os
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import barcode
+import qrcode
+from barcode.writer import ImageWriter
+from PIL import Image, ImageDraw, ImageFont
+
+from models import Student, Staff
+
+
+DPI = 300
+# Page sizes in pixels at 300 DPI
+PAGE_SIZES = {
+    'A4': (2480, 3508),
+    'LETTER': (2550, 3300),
+}
+MARGIN = 90
+
+
+def badge_people(person_type='student', department=None, ids=None, limit=None):
+    """Load the fields printed on each badge, at most ``limit`` people. Needs an app context."""
+    model = Student if person_type == 'student' else Staff
+    query = model.query
+    if department:
+        query = query.filter(model.department == department)
+    if ids:
+        query = query.filter(model.id.in_(ids))
+
+    people = []
+    for person in query.order_by(model.department, model.name, model.id).limit(limit):
+        if person_type == 'student':
+            subtitle = f'{person.reg_no} | {person.department}'
+        else:
+            subtitle = f'Staff | {person.department}'
+        people.append({'name': person.name, 'subtitle': subtitle, 'barcode': person.barcode})
+    return people
+
+
+def _fit_text(draw, text, size, max_width):
+    font = ImageFont.load_default(size=size)
+    while size > 12 and draw.textlength(text, font=font) > max_width:
+        size -= 4
+        font = ImageFont.load_default(size=size)
+    return font
+
+
+def render_badge(person, width, height):
+    """Draw one badge: name, subtitle, QR code and a Code128 barcode"""
+    tile = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(tile)
+    draw.rectangle([4, 4, width - 5, height - 5], outline=0, width=4)
+
+    padding = 40
+    qr_size = min(height - 2 * padding, width // 2 - padding)
+    qr = qrcode.QRCode(version=1, box_size=10, border=2)
+    qr.add_data(person['barcode'])
+    qr.make(fit=True)
+    qr_img = qr.make_image(fill_color='black', back_color='white').get_image().convert('L')
+    tile.paste(qr_img.resize((qr_size, qr_size), Image.NEAREST), (padding, (height - qr_size) // 2))
+
+    text_left = padding * 2 + qr_size
+    text_width = width - text_left - padding
+    name_font = _fit_text(draw, person['name'], 72, text_width)
+    draw.text((text_left, padding + 20), person['name'], fill=0, font=name_font)
+    draw.text((text_left, padding + 120), person['subtitle'], fill=0, font=_fit_text(draw, person['subtitle'], 44, text_width))
+
+    code128 = barcode.get('code128', person['barcode'], writer=ImageWriter())
+    bars = code128.render({'write_text': False, 'module_height': 12, 'quiet_zone': 1, 'dpi': DPI}).convert('L')
+    bars_height = height // 3
+    bars = bars.resize((text_width, bars_height), Image.NEAREST)
+    tile.paste(bars, (text_left, height - padding - bars_height - 60))
+    draw.text((text_left, height - padding - 50), person['barcode'], fill=0, font=ImageFont.load_default(size=40))
+    return tile
+
+
+def render_page(people, page_size='A4', columns=2, rows=4, fmt='pdf'):
+    """Tile badges onto one page.
+
+    Runs in worker processes, so it takes and returns plain data: PNG bytes,
+    or zlib-compressed raw grayscale pixels ready for a PDF image stream.
+    """
+    width, height = PAGE_SIZES[page_size]
+    page = Image.new('L', (width, height), 255)
+    tile_width = (width - 2 * MARGIN) // columns
+    tile_height = (height - 2 * MARGIN) // rows
+
+    for slot, person in enumerate(people):
+        column, row = slot % columns, slot // columns
+        tile = render_badge(person, tile_width - 20, tile_height - 20)
+        page.paste(tile, (MARGIN + column * tile_width + 10, MARGIN + row * tile_height + 10))
+
+    if fmt == 'png':
+        buffer = BytesIO()
+        page.save(buffer, format='PNG', dpi=(DPI, DPI))
+        return buffer.getvalue()
+    return zlib.compress(page.tobytes())
+
+
+def _render_pages(people, page_size, columns, rows, fmt, workers):
+    """Yield rendered pages in order, keeping only a few pages in flight"""
+    per_page = columns * rows
+    chunks = [people[start:start + per_page] for start in range(0, len(people), per_page)]
+
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield render_page(chunk, page_size, columns, rows, fmt)
+        return
+
+    # spawn, not fork: the web worker has background threads (SMS sender)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        in_flight = []
+        for chunk in chunks:
+            in_flight.append(pool.submit(render_page, chunk, page_size, columns, rows, fmt))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.pop(0).result()
+        for future in in_flight:
+            yield future.result()
+
+
+def _pdf_sheets(pages, page_size):
+    """Write a PDF one page at a time; the page tree and xref come last"""
+    width, height = PAGE_SIZES[page_size]
+    points = (width * 72 / DPI, height * 72 / DPI)
+    offsets = {}
+    position = 0
+
+    def emit(number, body, stream=None):
+        nonlocal position
+        offsets[number] = position
+        chunk = f'{number} 0 obj\n'.encode() + body
+        if stream is not None:
+            chunk += b'\nstream\n' + stream + b'\nendstream'
+        chunk += b'\nendobj\n'
+        position += len(chunk)
+        return chunk
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    position = len(header)
+    yield header
+    # Objects 1 and 2 are the catalog and the page tree
+    yield emit(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+    page_numbers = []
+    number = 3
+    for pixels in pages:
+        image, content, page = number, number + 1, number + 2
+        yield emit(image, (
+            f'<< /Type /XObject /Subtype /Image /Width {width} /Height {height} '
+            f'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode /Length {len(pixels)} >>'
+        ).encode(), pixels)
+        drawing = f'q {points[0]:.2f} 0 0 {points[1]:.2f} 0 0 cm /Im0 Do Q'.encode()
+        yield emit(content, f'<< /Length {len(drawing)} >>'.encode(), drawing)
+        yield emit(page, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {points[0]:.2f} {points[1]:.2f}] '
+            f'/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {content} 0 R >>'
+        ).encode())
+        page_numbers.append(page)
+        number += 3
+
+    kids = ' '.join(f'{page} 0 R' for page in page_numbers)
+    yield emit(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>'.encode())
+
+    xref = [f'xref\n0 {number}\n', '0000000000 65535 f \n']
+    xref += [f'{offsets[n]:010d} 00000 n \n' for n in range(1, number)]
+    yield ''.join(xref).encode()
+    yield f'trailer\n<< /Size {number} /Root 1 0 R >>\nstartxref\n{position}\n%%EOF\n'.encode()
+
+
+class _Sink:
+    """Write-only file object that hands back whatever was written so far"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _png_sheets(pages):
+    """Stream a ZIP holding one PNG per page"""
+    sink = _Sink()
+    # PNG data is already compressed, so store it as-is
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for number, png in enumerate(pages, start=1):
+            archive.writestr(f'badges_page_{number:03d}.png', png)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def badge_sheets(people, fmt='pdf', page_size='A4', columns=2, rows=4, workers=None):
+    """Render badges for people into print-ready sheets, yielding bytes.
+
+    ``fmt='pdf'`` produces one multi-page PDF; ``fmt='png'`` a ZIP of page
+    PNGs. Pages are rendered across a process pool and written out as they
+    finish, so memory stays flat however many badges are printed.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    pages = _render_pages(people, page_size, columns, rows, fmt, workers)
+    if fmt == 'png':
+        return _png_sheets(pages)
+    return _pdf_sheets(pages, page_size)
@@ -0,0 +1,141 @@
+import os
+import threading
+from collections import namedtuple
+
+from sqlalchemy import literal, null, select, union_all
+
+from models import db, Student, Staff
+
+
+# What the scan routes need to know about a person, without loading the row
+PersonEntry = namedtuple('PersonEntry', ['person_type', 'id', 'name', 'department', 'parent_phone'])
+
+
+def entry_for(person):
+    """Build an index entry from a Student or Staff instance"""
+    if isinstance(person, Student):
+        return PersonEntry('student', person.id, person.name, person.department, person.parent_phone)
+    return PersonEntry('staff', person.id, person.name, person.department, None)
+
+
+def resolve_barcodes(barcodes=None):
+    """Resolve barcodes against students and staff in a single query.
+
+    Passing None loads every barcode. Students win over staff when the
+    same code exists in both tables, matching the scan route's lookup order.
+    """
+    students = select(
+        Student.barcode, literal('student').label('person_type'), Student.id,
+        Student.name, Student.department, Student.parent_phone
+    )
+    staff = select(
+        Staff.barcode, literal('staff').label('person_type'), Staff.id,
+        Staff.name, Staff.department, null().label('parent_phone')
+    )
+    if barcodes is not None:
+        barcodes = list(set(barcodes))
+        if not barcodes:
+            return {}
+        students = students.where(Student.barcode.in_(barcodes))
+        staff = staff.where(Staff.barcode.in_(barcodes))
+
+    entries = {}
+    for row in db.session.execute(union_all(students, staff)):
+        if row.barcode in entries and entries[row.barcode].person_type == 'student':
+            continue
+        entries[row.barcode] = PersonEntry(row.person_type, row.id, row.name, row.department, row.parent_phone)
+    return entries
+
+
+class BarcodeIndex:
+    """Process-local map of barcode -> PersonEntry.
+
+    Loaded lazily on first use (or explicitly at startup) and kept current by
+    the registration routes. Misses fall back to one database lookup, so rows
+    registered by another worker are still found. Rows changed outside the app
+    are picked up after ``flask rebuild-barcode-index``, which touches a stamp
+    file every worker checks before a lookup.
+    """
+
+    def __init__(self, stamp_path=None):
+        self.stamp_path = stamp_path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._stamp = None
+        self.hits = 0
+        self.misses = 0
+
+    def _read_stamp(self):
+        if not self.stamp_path:
+            return None
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        """(Re)build the whole index from the database. Needs an app context."""
+        stamp = self._read_stamp()
+        entries = resolve_barcodes()
+        with self._lock:
+            self._entries = entries
+            self._stamp = stamp
+            self._loaded = True
+        return len(entries)
+
+    def mark_stale(self):
+        """Tell every process sharing the stamp file to reload on next lookup"""
+        if not self.stamp_path:
+            return
+        os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+        with open(self.stamp_path, 'a'):
+            pass
+        os.utime(self.stamp_path, None)
+
+    def _ensure_loaded(self):
+        if not self._loaded or self._read_stamp() != self._stamp:
+            self.load()
+
+    def add(self, barcode, entry):
+        with self._lock:
+            self._entries[barcode] = entry
+
+    def add_person(self, person):
+        self.add(person.barcode, entry_for(person))
+
+    def lookup(self, barcode):
+        """Return the PersonEntry for a barcode, or None if nobody has it"""
+        return self.lookup_many([barcode]).get(barcode)
+
+    def lookup_many(self, barcodes):
+        """Resolve several barcodes, hitting the database once for all misses"""
+        self._ensure_loaded()
+        found = {}
+        missing = []
+        for code in barcodes:
+            entry = self._entries.get(code)
+            if entry is None:
+                missing.append(code)
+            else:
+                found[code] = entry
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            resolved = resolve_barcodes(missing)
+            with self._lock:
+                self._entries.update(resolved)
+            found.update(resolved)
+        return found
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'loaded': self._loaded,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total * 100, 2) if total else 0
+            }
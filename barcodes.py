@@ -0,0 +1,128 @@
+import os
+import re
+import threading
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, BarcodeSequence
+
+
+# Crockford base32: no I, L, O or U, so misread characters are not valid symbols
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+# The check symbol is the value mod 37; values 32-36 use Crockford's extra symbols
+CHECK_ALPHABET = ALPHABET + '*~$=U'
+PAYLOAD_LENGTH = 8
+PAYLOAD_BITS = 5 * PAYLOAD_LENGTH
+# Odd multiplier and mask spread consecutive sequence numbers across the code
+# space; multiplying by an odd number is a bijection mod 2**40, so distinct
+# sequence numbers always give distinct codes.
+MULTIPLIER = 0x9E3779B97F
+MASK = 0x5A3C96E1D2
+SEQUENCE_NAME = 'person'
+
+# Codes issued before the allocator: the first 8 hex digits of a uuid4
+LEGACY_PATTERN = re.compile(r'^[0-9A-F]{8}$')
+DECODE = {symbol: value for value, symbol in enumerate(ALPHABET)}
+DECODE.update({'O': 0, 'I': 1, 'L': 1})
+
+
+def check_symbol(value):
+    return CHECK_ALPHABET[value % 37]
+
+
+def encode(sequence_number):
+    """Turn a sequence number into a 9-symbol code (8 payload + check)"""
+    value = ((sequence_number * MULTIPLIER) ^ MASK) & ((1 << PAYLOAD_BITS) - 1)
+    payload = ''.join(
+        ALPHABET[(value >> shift) & 31]
+        for shift in range(PAYLOAD_BITS - 5, -1, -5)
+    )
+    return payload + check_symbol(value)
+
+
+def normalize_barcode(raw):
+    """Return the canonical form of a scanned code, or None if it cannot be ours.
+
+    New codes are upper-cased, O/I/L are read as 0/1/1 and the check symbol
+    must match. Legacy 8-digit hex codes pass through without a check. No
+    database access is needed, so smudged or foreign codes are rejected
+    before any lookup.
+    """
+    if not isinstance(raw, str):
+        return None
+    code = raw.strip().upper().replace('-', '')
+    if len(code) == PAYLOAD_LENGTH + 1:
+        value = 0
+        for symbol in code[:PAYLOAD_LENGTH]:
+            digit = DECODE.get(symbol)
+            if digit is None:
+                return None
+            value = value * 32 + digit
+        if code[-1] != check_symbol(value):
+            return None
+        return ''.join(ALPHABET[DECODE[symbol]] for symbol in code[:PAYLOAD_LENGTH]) + code[-1]
+    if LEGACY_PATTERN.match(code):
+        return code
+    return None
+
+
+class BarcodeAllocator:
+    """Hands out collision-free barcodes from a database sequence.
+
+    Each process reserves a block of sequence numbers in its own short
+    transaction and issues codes from it without touching the database
+    again. Codes are the sequence numbers scrambled by a bijection, so no
+    two reservations can produce the same code and no retry is needed.
+    Numbers left in a block when a process exits are simply never used.
+    """
+
+    def __init__(self, app=None):
+        self.block_size = 32
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.block_size = app.config.get('BARCODE_BLOCK_SIZE', 32)
+
+    def _reserve(self, count):
+        """Claim ``count`` sequence numbers; returns the first one"""
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                update(BarcodeSequence)
+                .where(BarcodeSequence.name == SEQUENCE_NAME)
+                .values(next_value=BarcodeSequence.next_value + count)
+            )
+            if result.rowcount:
+                end = connection.execute(
+                    select(BarcodeSequence.next_value).where(BarcodeSequence.name == SEQUENCE_NAME)
+                ).scalar_one()
+                return end - count
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(BarcodeSequence).values(name=SEQUENCE_NAME, next_value=1 + count))
+            return 1
+        except IntegrityError:
+            # Another process created the row first
+            return self._reserve(count)
+
+    def allocate(self, count=1):
+        """Return ``count`` new barcodes. Needs an app context."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._next = self._end = 0
+                self._pid = os.getpid()
+            codes = []
+            while len(codes) < count:
+                if self._next >= self._end:
+                    needed = max(self.block_size, count - len(codes))
+                    self._next = self._reserve(needed)
+                    self._end = self._next + needed
+                take = min(count - len(codes), self._end - self._next)
+                codes.extend(encode(number) for number in range(self._next, self._next + take))
+                self._next += take
+            return codes
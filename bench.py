@@ -0,0 +1,157 @@
+import json
+import random
+import statistics
+import time
+from datetime import datetime
+
+from flask import url_for
+from sqlalchemy import event, func
+
+from models import db, Student, Staff, Attendance, StaffAttendance
+
+
+# logout ends the benchmark session and the event stream never finishes
+EXCLUDED_ENDPOINTS = {'static', 'logout', 'attendance_events'}
+# POST-only routes that register people are skipped so runs stay comparable
+WRITE_ENDPOINTS = {'register_staff', 'register_student', 'import_people'}
+
+
+def percentiles(samples):
+    """p50 / p95 / p99 of a list of numbers"""
+    if len(samples) == 1:
+        return samples[0], samples[0], samples[0]
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+def _samples(rng, size=50):
+    students = [row for row in db.session.query(Student.id, Student.barcode).order_by(func.random()).limit(size)]
+    staff = [row for row in db.session.query(Staff.id, Staff.barcode).order_by(func.random()).limit(size)]
+    if not students or not staff:
+        raise RuntimeError('The benchmark needs at least one student and one staff member; run `flask seed` first')
+    return {
+        'student_id': lambda: rng.choice(students).id,
+        'staff_id': lambda: rng.choice(staff).id,
+        'barcode': lambda: rng.choice(students).barcode,
+        'student_barcodes': [row.barcode for row in students],
+        'staff_barcodes': [row.barcode for row in staff],
+        'student_ids': [row.id for row in students],
+    }
+
+
+def build_requests(app, samples, rng):
+    """(endpoint, method, make_request) for every route the benchmark covers.
+
+    ``make_request()`` returns (url, request kwargs) and is called per
+    iteration, so scans hit a different barcode each time.
+    """
+    requests = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        endpoint = rule.endpoint
+        if endpoint in EXCLUDED_ENDPOINTS or (endpoint in WRITE_ENDPOINTS and 'GET' not in rule.methods):
+            continue
+
+        if endpoint == 'scan_barcode':
+            requests.append((endpoint, 'POST', lambda: (
+                '/scan_barcode', {'json': {'barcode': rng.choice(samples['student_barcodes'])}})))
+        elif endpoint == 'scan_staff_barcode':
+            requests.append((endpoint, 'POST', lambda: (
+                '/scan_staff_barcode', {'json': {'barcode': rng.choice(samples['staff_barcodes'])}})))
+        elif endpoint == 'scan_barcode_batch':
+            requests.append((endpoint, 'POST', lambda: (
+                '/scan_barcode/batch', {'json': {'scans': [
+                    {'barcode': code} for code in rng.sample(samples['student_barcodes'], min(20, len(samples['student_barcodes'])))
+                ]}})))
+        elif 'GET' in rule.methods:
+            def make_request(rule=rule, endpoint=endpoint):
+                values = {argument: samples[argument]() for argument in rule.arguments}
+                with app.test_request_context():
+                    url = url_for(endpoint, **values)
+                if endpoint == 'badge_sheet':
+                    # One sheet, not the whole school
+                    url += '?ids=' + ','.join(str(i) for i in samples['student_ids'][:8])
+                return url, {}
+            requests.append((endpoint, 'GET', make_request))
+    return requests
+
+
+def run_benchmark(app, iterations=20, username='admin', password='admin123', random_seed=1):
+    """Time every route through the test client; returns a JSON-ready dict.
+
+    Each route is requested ``iterations`` times and the whole response body
+    is read, so streamed reports are timed to the last byte. Scan routes
+    write attendance into the database being measured.
+    """
+    rng = random.Random(random_seed)
+    with app.app_context():
+        engine = db.engine
+        samples = _samples(rng)
+        dataset = {
+            'students': db.session.query(func.count(Student.id)).scalar(),
+            'staff': db.session.query(func.count(Staff.id)).scalar(),
+            'attendance': db.session.query(func.count(Attendance.id)).scalar(),
+            'staff_attendance': db.session.query(func.count(StaffAttendance.id)).scalar(),
+        }
+
+    client = app.test_client()
+    login = client.post('/login', data={'username': username, 'password': password, 'user_type': 'admin'})
+    if login.status_code != 302:
+        raise RuntimeError(f'Could not log in as {username}')
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    routes = {}
+    try:
+        for endpoint, method, make_request in build_requests(app, samples, rng):
+            timings, queries, statuses = [], [], {}
+            for _ in range(iterations):
+                url, kwargs = make_request()
+                statements.clear()
+                started = time.perf_counter()
+                response = client.open(url, method=method, **kwargs)
+                response.get_data()
+                timings.append((time.perf_counter() - started) * 1000)
+                response.close()
+                queries.append(len(statements))
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            p50, p95, p99 = percentiles(timings)
+            routes[endpoint] = {
+                'method': method,
+                'url': url,
+                'p50_ms': round(p50, 2),
+                'p95_ms': round(p95, 2),
+                'p99_ms': round(p99, 2),
+                'mean_ms': round(statistics.fmean(timings), 2),
+                'queries_median': statistics.median(queries),
+                'queries_max': max(queries),
+                'statuses': {str(code): n for code, n in sorted(statuses.items())},
+            }
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'database': engine.url.render_as_string(hide_password=True),
+        'iterations': iterations,
+        'dataset': dataset,
+        'routes': routes,
+    }
+
+
+def format_results(results):
+    """Plain-text table of a run_benchmark result"""
+    lines = [f"{'endpoint':<28} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}  status"]
+    for endpoint, route in results['routes'].items():
+        statuses = ' '.join(f'{code}x{n}' for code, n in route['statuses'].items())
+        lines.append(f"{endpoint:<28} {route['p50_ms']:>9.1f} {route['p95_ms']:>9.1f} {route['p99_ms']:>9.1f} "
+                     f"{route['queries_max']:>8}  {statuses}")
+    return '\n'.join(lines)
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
@@ -17,6 +17,101 @@ class Config:
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', '')
     TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER', '')
 
+    # SMS delivery: auto (Twilio if configured), twilio, console, stub or module:Class
+    SMS_TRANSPORT = os.environ.get('SMS_TRANSPORT', 'auto')
+    SMS_WORKERS = int(os.environ.get('SMS_WORKERS', '2'))          # 0 = no in-process sender, run `flask drain-sms`
+    SMS_BATCH_SIZE = int(os.environ.get('SMS_BATCH_SIZE', '100'))
+    SMS_MAX_RETRIES = int(os.environ.get('SMS_MAX_RETRIES', '3'))
+    SMS_RETRY_BACKOFF = float(os.environ.get('SMS_RETRY_BACKOFF', '2.0'))  # seconds, doubled per retry
+    SMS_DIGEST_WINDOW = int(os.environ.get('SMS_DIGEST_WINDOW', '60'))   # seconds to wait for more texts to the same phone
+    SMS_POLL_INTERVAL = float(os.environ.get('SMS_POLL_INTERVAL', '5'))
+    SMS_CLAIM_LEASE = int(os.environ.get('SMS_CLAIM_LEASE', '120'))      # seconds before an unfinished send is retried
+
     # Attendance Time Limits (in minutes)
     ATTENDANCE_TIME_LIMIT = int(os.environ.get('ATTENDANCE_TIME_LIMIT', '30'))  # 30 minutes after start time
     LATE_TIME_LIMIT = int(os.environ.get('LATE_TIME_LIMIT', '60'))       # 60 minutes for late marking
+
+    # How many of each staff member's latest records the staff attendance page uses
+    STAFF_HISTORY_DAYS = int(os.environ.get('STAFF_HISTORY_DAYS', '30'))
+
+    # Live dashboard feed (/events/attendance): broker file (default instance/events.db) and timings in seconds
+    EVENTS_DB = os.environ.get('EVENTS_DB', '')
+    EVENTS_RETENTION = int(os.environ.get('EVENTS_RETENTION', '3600'))
+    EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', '1.0'))
+    EVENTS_SNAPSHOT_INTERVAL = int(os.environ.get('EVENTS_SNAPSHOT_INTERVAL', '30'))
+    EVENTS_STREAM_MAX_SECONDS = int(os.environ.get('EVENTS_STREAM_MAX_SECONDS', '300'))
+
+    # Rows per page on the student list pages (?page_size= may ask for up to MAX_PAGE_SIZE)
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE', '50'))
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '500'))
+
+    # People per page in the "not marked yet" lists
+    UNMARKED_PAGE_SIZE = int(os.environ.get('UNMARKED_PAGE_SIZE', '100'))
+
+    # Rows fetched per round trip when streaming CSV reports
+    REPORT_YIELD_PER = int(os.environ.get('REPORT_YIELD_PER', '1000'))
+
+    # Rendered QR codes: disk cache directory (default instance/qr_cache) and in-memory LRU size
+    QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR', '')
+    QR_CACHE_MEMORY_ITEMS = int(os.environ.get('QR_CACHE_MEMORY_ITEMS', '256'))
+
+    # Badge sheets: page size (A4/LETTER) and badges per page
+    BADGE_PAGE_SIZE = os.environ.get('BADGE_PAGE_SIZE', 'A4')
+    BADGE_COLUMNS = int(os.environ.get('BADGE_COLUMNS', '2'))
+    BADGE_ROWS = int(os.environ.get('BADGE_ROWS', '4'))
+    # Render processes each badge download spawns, per web worker, so keep it
+    # small (1 renders in-process); `flask badges --workers 0` uses every CPU
+    BADGE_WORKERS = int(os.environ.get('BADGE_WORKERS', '2'))
+    # Most badges one web request may render; larger runs go through `flask badges`
+    BADGE_MAX_PER_REQUEST = int(os.environ.get('BADGE_MAX_PER_REQUEST', '400'))
+
+    # Largest number of scans accepted by /scan_barcode/batch in one request
+    SCAN_BATCH_MAX_ITEMS = int(os.environ.get('SCAN_BATCH_MAX_ITEMS', '500'))
+    # Oldest buffered scan accepted, in seconds; anything older is rejected
+    SCAN_BATCH_MAX_AGE = int(os.environ.get('SCAN_BATCH_MAX_AGE', '86400'))
+
+    # Rows inserted per transaction by the CSV import
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '500'))
+
+    # Barcode sequence numbers each worker reserves per database round trip
+    BARCODE_BLOCK_SIZE = int(os.environ.get('BARCODE_BLOCK_SIZE', '32'))
+
+    # Logged-in users cached per worker: seconds before a reload, and entries kept
+    AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', '60'))
+    AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', '1024'))
+
+    # werkzeug password hash method for new hashes, e.g. scrypt:16384:8:1 or pbkdf2:sha256:600000
+    # (compare with `flask bench-password-hash`); older hashes are upgraded on login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # Password checks allowed to run at the same time in one worker
+    PASSWORD_CHECK_CONCURRENCY = int(os.environ.get('PASSWORD_CHECK_CONCURRENCY', '2'))
+
+    # Logging (see logs.py): root level, per-logger overrides such as
+    # "attendance.sms=DEBUG,werkzeug=WARNING", and text or json output
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    # Share of per-scan INFO logs kept, and a cap per second (0 = no cap)
+    LOG_SCAN_SAMPLE_RATE = float(os.environ.get('LOG_SCAN_SAMPLE_RATE', '1.0'))
+    LOG_SCAN_MAX_PER_SECOND = int(os.environ.get('LOG_SCAN_MAX_PER_SECOND', '20'))
+
+    # /metrics: per-process snapshot directory (default instance/metrics), how often
+    # each worker writes its snapshot, and a bearer token for scrapers (admins need none)
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+    # X-DB-Queries / Server-Timing response headers; unset = only in debug mode
+    DB_TIMING_HEADERS = {'1': True, '0': False}.get(os.environ.get('DB_TIMING_HEADERS', ''))
+
+    # Database profile (see db_profile.py). SQLite: busy timeout, page cache, sync level
+    DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', '5000'))
+    DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', '20000'))
+    DB_SQLITE_SYNCHRONOUS = os.environ.get('DB_SQLITE_SYNCHRONOUS', 'NORMAL')
+    # PostgreSQL: connection pool, and timeouts for the web app (maintenance commands run without them)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '20'))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '10'))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '5000'))
+    DB_LOCK_TIMEOUT_MS = int(os.environ.get('DB_LOCK_TIMEOUT_MS', '2000'))
@@ -0,0 +1,136 @@
+import functools
+import logging
+import sqlite3
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+
+from models import db
+
+
+logger = logging.getLogger('attendance.db')
+
+_sqlite_pragmas = {}
+# PostgreSQL session settings for new connections; maintenance commands clear them
+_server_timeouts = {}
+_checked = False
+
+
+def _normalize_uri(uri):
+    # Heroku-style URLs; SQLAlchemy only accepts the postgresql:// scheme
+    if uri and uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def sqlite_pragmas(config):
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': config.get('DB_SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': config.get('DB_BUSY_TIMEOUT_MS', 5000),
+        # Negative means KiB rather than pages
+        'cache_size': -config.get('DB_CACHE_SIZE_KB', 20000),
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Run the configured PRAGMAs on every new SQLite connection"""
+    global _checked
+    if not _sqlite_pragmas or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in _sqlite_pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    if not _checked:
+        _checked = True
+        mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+        if mode.lower() != 'wal':
+            # In-memory databases and some network filesystems cannot use WAL
+            logger.warning("SQLite is running in %s journal mode, not WAL; readers will block on scan commits", mode)
+    cursor.close()
+
+
+@event.listens_for(Engine, 'connect')
+def _apply_server_timeouts(dbapi_connection, connection_record):
+    """SET the web statement and lock timeouts on every new PostgreSQL connection"""
+    if not _server_timeouts or isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in _server_timeouts.items():
+        cursor.execute(f'SET {name} = {int(value)}')
+    cursor.close()
+    # SET is transactional; commit so the pool's reset-on-return keeps it
+    dbapi_connection.commit()
+
+
+def without_timeouts(command):
+    """Run a CLI command without the web statement and lock timeouts.
+
+    Index builds, summary rebuilds, seeding and imports legitimately run for
+    minutes. Pooled connections are dropped so every connection the command
+    opens starts without the timeouts.
+    """
+    @functools.wraps(command)
+    def wrapper(*args, **kwargs):
+        if _server_timeouts:
+            _server_timeouts.clear()
+            db.engine.dispose()
+        return command(*args, **kwargs)
+    return wrapper
+
+
+def configure_database(app):
+    """Pick engine settings for the configured database. Call before db.init_app.
+
+    SQLite gets WAL mode, synchronous=NORMAL, a busy timeout and a larger
+    page cache on every connection, so dashboard reads no longer wait on
+    scan commits. PostgreSQL gets a sized connection pool with pre-ping and
+    recycling, plus statement and lock timeouts set on each connection
+    (maintenance commands opt out with ``without_timeouts``). Options already
+    set in SQLALCHEMY_ENGINE_OPTIONS are left alone, and the timeouts are
+    skipped when connect_args carries its own libpq ``options``. Returns the
+    active settings, which are also logged.
+    """
+    config = app.config
+    uri = config['SQLALCHEMY_DATABASE_URI'] = _normalize_uri(config['SQLALCHEMY_DATABASE_URI'])
+    url = make_url(uri)
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+
+    if url.get_backend_name() == 'sqlite':
+        _sqlite_pragmas.clear()
+        _sqlite_pragmas.update(sqlite_pragmas(config))
+        settings = {'backend': 'sqlite', **_sqlite_pragmas}
+    else:
+        options.setdefault('pool_size', config.get('DB_POOL_SIZE', 10))
+        options.setdefault('max_overflow', config.get('DB_MAX_OVERFLOW', 20))
+        options.setdefault('pool_timeout', config.get('DB_POOL_TIMEOUT', 10))
+        options.setdefault('pool_recycle', config.get('DB_POOL_RECYCLE', 1800))
+        options.setdefault('pool_pre_ping', True)
+        settings = {'backend': url.get_backend_name(), **options}
+        settings.pop('connect_args', None)
+        _server_timeouts.clear()
+        if url.get_backend_name() == 'postgresql' and 'options' not in (options.get('connect_args') or {}):
+            _server_timeouts.update({
+                'statement_timeout': config.get('DB_STATEMENT_TIMEOUT_MS', 5000),
+                'lock_timeout': config.get('DB_LOCK_TIMEOUT_MS', 2000),
+            })
+            settings.update(_server_timeouts)
+
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    logger.info("Database profile", extra={'database': url.render_as_string(hide_password=True), **settings})
+    return settings
+
+
+def active_settings(session):
+    """Read the settings back from the live database (for `flask db-profile`)"""
+    bind = session.get_bind()
+    settings = {'pool': bind.pool.status()}
+    if bind.dialect.name == 'sqlite':
+        for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size'):
+            settings[name] = session.execute(text(f'PRAGMA {name}')).scalar()
+    elif bind.dialect.name == 'postgresql':
+        for name in ('statement_timeout', 'lock_timeout', 'max_connections'):
+            settings[name] = session.execute(text(f'SHOW {name}')).scalar()
+    return settings
@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+logger = logging.getLogger('attendance.events')
+
+
+class EventBroker:
+    """Fan attendance events out to every worker process through a SQLite file.
+
+    ``publish`` appends a row; subscribers in any process poll for rows newer
+    than the last id they saw. The file is separate from the main database,
+    runs in WAL mode with fsync off (events are disposable) and is pruned to
+    the last EVENTS_RETENTION seconds.
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self._local = threading.local()
+        self._published = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config.get('EVENTS_DB') or os.path.join(app.instance_path, 'events.db')
+        self.retention = app.config.get('EVENTS_RETENTION', 3600)
+        self.poll_interval = app.config.get('EVENTS_POLL_INTERVAL', 1.0)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, '
+                'type TEXT NOT NULL, payload TEXT NOT NULL)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def publish(self, event_type, data):
+        """Append an event; failures are logged and never raised to the caller"""
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                'INSERT INTO events (created_at, type, payload) VALUES (?, ?, ?)',
+                (now, event_type, json.dumps(data, default=str))
+            )
+            self._published += 1
+            if self._published % 500 == 0:
+                conn.execute('DELETE FROM events WHERE created_at < ?', (now - self.retention,))
+        except sqlite3.Error as e:
+            logger.warning("Could not publish %s event: %s", event_type, e)
+
+    def last_id(self):
+        row = self._connection().execute('SELECT MAX(id) FROM events').fetchone()
+        return row[0] or 0
+
+    def read_since(self, last_id, limit=500):
+        """Events newer than last_id as (id, type, json payload) tuples"""
+        return self._connection().execute(
+            'SELECT id, type, payload FROM events WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, limit)
+        ).fetchall()
+
+
+def format_sse(data, event=None, event_id=None):
+    """Encode one Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    for line in (data if isinstance(data, str) else json.dumps(data, default=str)).splitlines():
+        lines.append(f'data: {line}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,31 @@
+"""gunicorn settings: threaded workers, and per-worker metrics snapshots (see metrics.py) kept in step.
+
+    gunicorn app:app
+
+Each /events/attendance client holds its connection for up to
+EVENTS_STREAM_MAX_SECONDS, so sync workers (one request at a time) would let a
+few open dashboards starve /scan_barcode. gthread workers serve every stream
+on its own thread; size GUNICORN_THREADS above the number of open dashboards
+plus the scan gates.
+"""
+import os
+
+from config import Config
+from metrics import clear_snapshots, metrics_directory, retire_snapshots
+
+
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+
+_metrics_dir = metrics_directory(vars(Config), os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance'))
+
+
+def on_starting(server):
+    # A new deployment starts its counters from zero
+    clear_snapshots(_metrics_dir)
+
+
+def child_exit(server, worker):
+    # Fold the exited worker's counters away before its pid can be reused
+    retire_snapshots(_metrics_dir, worker.pid)
@@ -0,0 +1,105 @@
+import csv
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from barcode_index import PersonEntry
+from models import db, Student, Staff
+
+
+REQUIRED_COLUMNS = {
+    'student': ('name', 'reg_no', 'department', 'parent_phone'),
+    'staff': ('name', 'department', 'password'),
+}
+
+
+def _validate(reader, person_type):
+    """Split CSV rows into (valid rows, errors), checking reg_nos in one query"""
+    required = REQUIRED_COLUMNS[person_type]
+    missing = [column for column in required if column not in (reader.fieldnames or [])]
+    if missing:
+        return [], [{'line': 1, 'error': f"Missing column(s): {', '.join(missing)}"}]
+
+    rows, errors = [], []
+    seen = set()
+    # Line 1 is the header
+    for line, record in enumerate(reader, start=2):
+        values = {column: (record.get(column) or '').strip() for column in required}
+        empty = [column for column in required if not values[column]]
+        if empty:
+            errors.append({'line': line, 'reg_no': values.get('reg_no'), 'error': f"Empty field(s): {', '.join(empty)}"})
+            continue
+        if person_type == 'student':
+            if values['reg_no'] in seen:
+                errors.append({'line': line, 'reg_no': values['reg_no'], 'error': 'Duplicate reg_no in file'})
+                continue
+            if len(values['parent_phone']) > 15:
+                errors.append({'line': line, 'reg_no': values['reg_no'], 'error': 'parent_phone longer than 15 characters'})
+                continue
+            seen.add(values['reg_no'])
+        rows.append((line, values))
+
+    if person_type == 'student' and seen:
+        existing = set(db.session.execute(select(Student.reg_no).where(Student.reg_no.in_(seen))).scalars())
+        for line, values in rows:
+            if values['reg_no'] in existing:
+                errors.append({'line': line, 'reg_no': values['reg_no'], 'error': 'Student with this registration number already exists'})
+        rows = [(line, values) for line, values in rows if values['reg_no'] not in existing]
+    return rows, errors
+
+
+def _build_record(person_type, values, barcode_str):
+    if person_type == 'student':
+        return {**values, 'barcode': barcode_str}
+    staff = Staff(name=values['name'], department=values['department'], barcode=barcode_str)
+    staff.set_password(values['password'])
+    return {'name': staff.name, 'department': staff.department, 'barcode': barcode_str, 'password_hash': staff.password_hash}
+
+
+def import_people(stream, allocator, person_type='student', chunk_size=500, on_inserted=None):
+    """Import students or staff from a CSV text stream.
+
+    Rows are validated up front, barcodes for the whole file are taken from
+    ``allocator`` (a BarcodeAllocator) at once and records are inserted with executemany, committing every
+    ``chunk_size`` rows. A failing chunk is retried row by row so one bad
+    row does not sink its neighbours. QR codes are not rendered here; they
+    are produced on demand by /qr/<code>.png and the badge sheets.
+    ``on_inserted(barcode, entry)`` is called with a PersonEntry for every
+    committed row so callers can update the barcode index.
+
+    Returns ``{'imported': n, 'errors': [{'line', 'reg_no', 'error'}, ...]}``.
+    """
+    model = Student if person_type == 'student' else Staff
+    rows, errors = _validate(csv.DictReader(stream), person_type)
+    barcodes = allocator.allocate(len(rows))
+    returning = [model.id, model.barcode, model.name, model.department]
+    if person_type == 'student':
+        returning.append(Student.parent_phone)
+
+    imported = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        records = [
+            _build_record(person_type, values, barcodes[start + offset])
+            for offset, (_, values) in enumerate(chunk)
+        ]
+        try:
+            inserted = db.session.execute(insert(model).returning(*returning), records).all()
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            inserted = []
+            for (line, values), record in zip(chunk, records):
+                try:
+                    inserted.append(db.session.execute(insert(model).values(**record).returning(*returning)).one())
+                    db.session.commit()
+                except IntegrityError as e:
+                    db.session.rollback()
+                    errors.append({'line': line, 'reg_no': values.get('reg_no'), 'error': str(e.orig)})
+        imported += len(inserted)
+        if on_inserted:
+            for row in inserted:
+                on_inserted(row.barcode, PersonEntry(person_type, row.id, row.name, row.department, getattr(row, 'parent_phone', None)))
+
+    errors.sort(key=lambda error: error['line'])
+    return {'imported': imported, 'errors': errors}
@@ -0,0 +1,283 @@
+"""Morning-rush load test for the scan route.
+
+Replays a synthetic arrival curve - a steady trickle plus a burst around
+9:00 - across a number of gates, each gate scanning one badge at a time,
+and reports throughput, latency percentiles, outcomes and lock timeouts.
+
+    python loadtest.py --url http://127.0.0.1:5000 --gates 8 --scans 3000 --duration 120
+    python loadtest.py --in-process --gates 4 --scans 500 --duration 20
+
+The simulated window (--window-start to --window-end) is compressed into
+--duration real seconds. Badge barcodes are read from --barcodes-file (one
+per line) or, when omitted, from the app's own database.
+"""
+import argparse
+import json
+import random
+import statistics
+import string
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+# Error text that means the database gave up waiting for a lock
+LOCK_ERRORS = ('database is locked', 'lock timeout', 'could not obtain lock', 'deadlock detected')
+
+
+def arrival_offsets(count, window_minutes, burst_at, burst_share, burst_spread, rng):
+    """Minutes into the window for each scan, sorted.
+
+    ``burst_share`` of the arrivals are normally distributed around
+    ``burst_at`` (minutes into the window) with ``burst_spread`` standard
+    deviation; the rest arrive uniformly.
+    """
+    offsets = []
+    for _ in range(count):
+        if rng.random() < burst_share:
+            offset = rng.gauss(burst_at, burst_spread)
+        else:
+            offset = rng.uniform(0, window_minutes)
+        offsets.append(min(max(offset, 0), window_minutes))
+    return sorted(offsets)
+
+
+def invalid_barcode(rng):
+    """A misread: right length, random symbols (almost always a bad check symbol)"""
+    return ''.join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(9))
+
+
+def build_schedule(barcodes, scans, duplicate_share, invalid_share, rng, **curve):
+    """(minutes into window, barcode, kind) for every scan in arrival order"""
+    offsets = arrival_offsets(scans, rng=rng, **curve)
+    unused = list(barcodes)
+    rng.shuffle(unused)
+    scanned = []
+    schedule = []
+    for offset in offsets:
+        roll = rng.random()
+        if roll < invalid_share:
+            schedule.append((offset, invalid_barcode(rng), 'invalid'))
+        elif (roll < invalid_share + duplicate_share and scanned) or not unused:
+            schedule.append((offset, rng.choice(scanned), 'duplicate'))
+        else:
+            code = unused.pop()
+            scanned.append(code)
+            schedule.append((offset, code, 'first'))
+    return schedule
+
+
+class HttpTarget:
+    """POST scans to a running server"""
+
+    def __init__(self, url, timeout=10):
+        self.url = url.rstrip('/') + '/scan_barcode'
+        self.timeout = timeout
+
+    def scan(self, barcode):
+        body = json.dumps({'barcode': barcode}).encode()
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+
+class InProcessTarget:
+    """Call the app through one test client per gate thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def scan(self, barcode):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post('/scan_barcode', json={'barcode': barcode})
+        return response.status_code, response.get_data(as_text=True)
+
+
+def classify(status, body):
+    if status == 201:
+        return 'marked'
+    if status == 200:
+        return 'already_marked'
+    if status == 404:
+        return 'not_found'
+    if status >= 500 and any(text in body.lower() for text in LOCK_ERRORS):
+        return 'lock_timeout'
+    if status >= 500:
+        return 'server_error'
+    return f'http_{status}'
+
+
+def run_gate(target, scans, started, time_scale, results):
+    """One gate: scan its badges in order, never before their arrival time"""
+    for offset, barcode, kind in scans:
+        due = started + offset * 60 / time_scale
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent = time.perf_counter()
+        try:
+            status, body = target.scan(barcode)
+            outcome = classify(status, body)
+        except Exception:
+            outcome = 'transport_error'
+            status = None
+        finished = time.perf_counter()
+        results.append({
+            'kind': kind,
+            'outcome': outcome,
+            'status': status,
+            'latency_ms': (finished - sent) * 1000,
+            # Time spent queued behind earlier scans at the same gate
+            'queue_ms': max(sent - due, 0) * 1000,
+            'finished': finished - started,
+        })
+
+
+def run_load_test(target, barcodes, gates=4, scans=1000, duration=60.0, window_minutes=75,
+                  burst_at=30, burst_share=0.7, burst_spread=7, duplicate_share=0.05,
+                  invalid_share=0.02, target_ms=300, random_seed=7):
+    """Run the morning rush against ``target`` and return a report dict"""
+    rng = random.Random(random_seed)
+    schedule = build_schedule(
+        barcodes, scans, duplicate_share, invalid_share, rng,
+        window_minutes=window_minutes, burst_at=burst_at, burst_share=burst_share, burst_spread=burst_spread
+    )
+    # Spread arrivals over gates at random, as people pick the shortest-looking line
+    per_gate = [[] for _ in range(gates)]
+    for scan in schedule:
+        per_gate[rng.randrange(gates)].append(scan)
+
+    time_scale = window_minutes * 60 / duration
+    results = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=gates, thread_name_prefix='gate') as pool:
+        for future in [pool.submit(run_gate, target, gate_scans, started, time_scale, results) for gate_scans in per_gate]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    return summarize(results, elapsed, gates, target_ms)
+
+
+def _percentiles(values):
+    if len(values) < 2:
+        return {'p50': values[0] if values else 0, 'p95': values[0] if values else 0, 'p99': values[0] if values else 0}
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {'p50': round(cuts[49], 1), 'p95': round(cuts[94], 1), 'p99': round(cuts[98], 1)}
+
+
+def summarize(results, elapsed, gates, target_ms):
+    latencies = [r['latency_ms'] for r in results]
+    outcomes = {}
+    for r in results:
+        outcomes[r['outcome']] = outcomes.get(r['outcome'], 0) + 1
+    by_kind = {}
+    for r in results:
+        kind = by_kind.setdefault(r['kind'], {})
+        kind[r['outcome']] = kind.get(r['outcome'], 0) + 1
+    per_second = {}
+    for r in results:
+        second = int(r['finished'])
+        per_second[second] = per_second.get(second, 0) + 1
+    errors = sum(n for outcome, n in outcomes.items() if outcome not in ('marked', 'already_marked', 'not_found'))
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'gates': gates,
+        'scans': len(results),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_per_s': round(len(results) / elapsed, 1) if elapsed else 0,
+        'peak_per_s': max(per_second.values(), default=0),
+        'latency_ms': {**_percentiles(latencies), 'max': round(max(latencies, default=0), 1)},
+        'queue_ms': _percentiles([r['queue_ms'] for r in results]),
+        'over_target': sum(1 for latency in latencies if latency > target_ms),
+        'target_ms': target_ms,
+        'error_rate': round(errors / len(results), 4) if results else 0,
+        'lock_timeouts': outcomes.get('lock_timeout', 0),
+        'outcomes': outcomes,
+        'by_kind': by_kind,
+    }
+
+
+def format_report(report):
+    latency = report['latency_ms']
+    lines = [
+        f"Scans: {report['scans']} over {report['elapsed_s']}s at {report['gates']} gates",
+        f"Throughput: {report['throughput_per_s']}/s (peak {report['peak_per_s']}/s)",
+        f"Latency ms: p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}",
+        f"Gate queueing ms: p50 {report['queue_ms']['p50']}  p95 {report['queue_ms']['p95']}",
+        f"Over {report['target_ms']} ms: {report['over_target']}",
+        f"Error rate: {report['error_rate'] * 100:.2f}%  lock timeouts: {report['lock_timeouts']}",
+        'Outcomes: ' + ', '.join(f'{k}={v}' for k, v in sorted(report['outcomes'].items())),
+    ]
+    for kind, outcomes in sorted(report['by_kind'].items()):
+        lines.append(f'  {kind}: ' + ', '.join(f'{k}={v}' for k, v in sorted(outcomes.items())))
+    return '\n'.join(lines)
+
+
+def load_barcodes(path):
+    if path:
+        with open(path) as f:
+            return [line.strip() for line in f if line.strip()]
+    from app import app
+    from models import db, Student
+    with app.app_context():
+        return [code for code, in db.session.query(Student.barcode)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a morning rush against /scan_barcode')
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument('--url', help='Base URL of a running server')
+    where.add_argument('--in-process', action='store_true', help='Drive the app through its test client')
+    parser.add_argument('--barcodes-file', help='Badge barcodes, one per line (default: read from the database)')
+    parser.add_argument('--gates', type=int, default=4)
+    parser.add_argument('--scans', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=60.0, help='Real seconds the window is compressed into')
+    parser.add_argument('--window-start', default='08:30', help='Simulated start of the morning (HH:MM)')
+    parser.add_argument('--window-end', default='09:45', help='Simulated end of the morning (HH:MM)')
+    parser.add_argument('--burst-at', default='09:00', help='Centre of the rush (HH:MM)')
+    parser.add_argument('--burst-share', type=float, default=0.7, help='Share of arrivals in the rush')
+    parser.add_argument('--burst-spread', type=float, default=7, help='Rush standard deviation in minutes')
+    parser.add_argument('--duplicates', type=float, default=0.05, help='Share of repeat scans')
+    parser.add_argument('--invalid', type=float, default=0.02, help='Share of misread scans')
+    parser.add_argument('--target-ms', type=float, default=300)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Write the report as JSON')
+    args = parser.parse_args(argv)
+
+    def minutes(value):
+        moment = datetime.strptime(value, '%H:%M')
+        return moment.hour * 60 + moment.minute
+
+    window_start = minutes(args.window_start)
+    barcodes = load_barcodes(args.barcodes_file)
+    if not barcodes:
+        parser.error('no barcodes to scan; seed the database or pass --barcodes-file')
+    if args.in_process:
+        from app import app
+        target = InProcessTarget(app)
+    else:
+        target = HttpTarget(args.url)
+
+    report = run_load_test(
+        target, barcodes, gates=args.gates, scans=args.scans, duration=args.duration,
+        window_minutes=minutes(args.window_end) - window_start,
+        burst_at=minutes(args.burst_at) - window_start, burst_share=args.burst_share,
+        burst_spread=args.burst_spread, duplicate_share=args.duplicates,
+        invalid_share=args.invalid, target_ms=args.target_ms, random_seed=args.seed
+    )
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """Format records as text with trailing key=value fields, or as JSON lines.
+
+    Fields passed with ``extra={...}`` are emitted as structured fields.
+    """
+
+    def __init__(self, json_lines=False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+        timestamp = datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds')
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if self.json_lines:
+            entry = {'ts': timestamp, 'level': record.levelname, 'logger': record.name, 'msg': message, **fields}
+            if record.exc_text:
+                entry['exc'] = record.exc_text
+            return json.dumps(entry, default=str)
+
+        line = f'{timestamp} {record.levelname:<7} [{record.name}] {message}'
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Let through a fraction of INFO and DEBUG records, at most max_per_second.
+
+    Warnings and errors always pass. Used on the per-scan logger so a
+    morning rush cannot flood the log.
+    """
+
+    def __init__(self, rate=1.0, max_per_second=0):
+        super().__init__()
+        self.rate = rate
+        self.max_per_second = max_per_second
+        self.dropped = 0
+        self._tokens = float(max_per_second)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.rate < 1 and random.random() >= self.rate:
+            self.dropped += 1
+            return False
+        if not self.max_per_second:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_per_second, self._tokens + (now - self._refilled) * self.max_per_second)
+            self._refilled = now
+            if self._tokens < 1:
+                self.dropped += 1
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _QueueHandler(QueueHandler):
+    """QueueHandler that keeps the traceback apart from the message"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+def parse_levels(value):
+    """Parse 'attendance.sms=DEBUG,werkzeug=WARNING' into a dict"""
+    levels = {}
+    for part in (value or '').split(','):
+        name, _, level = part.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _start_listener(handler, fresh_queue=False):
+    global _listener
+    if fresh_queue:
+        # Records queued by the parent before the fork are the parent's to write
+        handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(handler.queue, *handler.targets, respect_handler_level=True)
+    _listener.start()
+
+
+def configure_logging(app):
+    """Route all logging through a queue drained by a background thread.
+
+    Request threads only put records on an in-memory queue; formatting and
+    writing to stdout happen on the listener thread. Levels come from
+    LOG_LEVEL plus per-logger overrides in LOG_LEVELS, and the scan logger
+    is sampled with LOG_SCAN_SAMPLE_RATE / LOG_SCAN_MAX_PER_SECOND.
+    """
+    root = logging.getLogger()
+    if not any(getattr(handler, 'targets', None) for handler in root.handlers):
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(StructuredFormatter(json_lines=app.config.get('LOG_FORMAT') == 'json'))
+        handler = _QueueHandler(queue.SimpleQueue())
+        handler.targets = [output]
+        root.addHandler(handler)
+        _start_listener(handler)
+        atexit.register(lambda: _listener.stop())
+        # The listener thread does not survive fork; start a new one in the child
+        os.register_at_fork(after_in_child=lambda: _start_listener(handler, fresh_queue=True))
+
+    root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    for name, level in parse_levels(app.config.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+
+    scan_logger = logging.getLogger('attendance.scan')
+    for existing in [f for f in scan_logger.filters if isinstance(f, SamplingFilter)]:
+        scan_logger.removeFilter(existing)
+    scan_logger.addFilter(SamplingFilter(
+        rate=app.config.get('LOG_SCAN_SAMPLE_RATE', 1.0),
+        max_per_second=app.config.get('LOG_SCAN_MAX_PER_SECOND', 0)
+    ))
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+
+def request_fields(**fields):
+    """Structured fields for a log call inside a request: route and latency so far"""
+    if has_request_context():
+        fields.setdefault('route', request.endpoint)
+        started = g.get('request_started')
+        if started is not None:
+            fields.setdefault('latency_ms', round((time.perf_counter() - started) * 1000, 1))
+    return fields
@@ -0,0 +1,333 @@
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from flask import g, request
+
+
+# Latency buckets in seconds; 0.3 is the scan gate target
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.3, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Counters of workers that have exited, kept so the sums never go backwards
+RETIRED_SNAPSHOT = 'retired.json'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def metrics_directory(config, instance_path):
+    return config.get('METRICS_DIR') or os.path.join(instance_path, 'metrics')
+
+
+def _merge(total, data):
+    """Add one snapshot's counters (not its in-flight gauges) into ``total``"""
+    for key, value in data['requests'].items():
+        total['requests'][key] = total['requests'].get(key, 0) + value
+    for key, value in data['scans'].items():
+        total['scans'][key] = total['scans'].get(key, 0) + value
+    for endpoint, histogram in data['latency'].items():
+        merged = total['latency'].setdefault(endpoint, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+        merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+        merged['sum'] += histogram['sum']
+        merged['count'] += histogram['count']
+
+
+def _write_json(directory, name, data):
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+def clear_snapshots(directory):
+    """Remove every snapshot, so a new deployment starts its counters from zero.
+
+    Call from the server's master process before any worker starts (see
+    gunicorn.conf.py).
+    """
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def retire_snapshots(directory, pid):
+    """Fold an exited worker's snapshot into retired.json and remove it.
+
+    Keeps the summed counters monotonic while freeing the pid for reuse.
+    Call from the master process once the worker has been reaped; only the
+    master writes retired.json.
+    """
+    retired_path = os.path.join(directory, RETIRED_SNAPSHOT)
+    try:
+        with open(retired_path) as f:
+            retired = json.load(f)
+    except (OSError, ValueError):
+        retired = {'pid': None, 'requests': {}, 'latency': {}, 'in_flight': {}, 'scans': {}}
+    paths = glob.glob(os.path.join(directory, f'{pid}-*.json'))
+    for path in paths:
+        try:
+            with open(path) as f:
+                _merge(retired, json.load(f))
+        except (OSError, ValueError):
+            continue
+    if paths:
+        _write_json(directory, RETIRED_SNAPSHOT, retired)
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class _TrackedStream:
+    """Response body that calls ``on_close`` once the server closes it"""
+
+    def __init__(self, chunks, on_close):
+        self._chunks = chunks
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        on_close, self._on_close = self._on_close, None
+        try:
+            if hasattr(self._chunks, 'close'):
+                self._chunks.close()
+        finally:
+            if on_close is not None:
+                on_close()
+
+
+class Metrics:
+    """Request and scan metrics shared by every worker process.
+
+    Each process counts in memory and writes a JSON snapshot to
+    METRICS_DIR/<pid>-<process id token>.json at most every
+    METRICS_FLUSH_INTERVAL seconds, from a background thread as well, so a
+    worker that goes idle after a burst still persists its last counts (and
+    again at exit and on every scrape). The random token keeps a new worker that
+    reuses an old pid from overwriting its predecessor's counts. ``render()``
+    sums the snapshots of all processes, so the totals are right whichever
+    worker serves /metrics. Under gunicorn, gunicorn.conf.py clears the
+    snapshots when the master starts and folds each exited worker's counters
+    into retired.json; with other servers, clear METRICS_DIR when redeploying.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.flush_interval = 5.0
+        self._lock = threading.Lock()
+        self._reset()
+        if app is not None:
+            self.init_app(app)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._token = uuid.uuid4().hex
+        self._requests = {}
+        self._latency = {}
+        self._in_flight = {}
+        self._scans = {}
+        self._flushed = 0.0
+        self._dirty = False
+        self._flusher_pid = None
+
+    def init_app(self, app):
+        self.directory = metrics_directory(app.config, app.instance_path)
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5.0)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        atexit.register(self.flush)
+
+    def _current(self):
+        # A forked worker must not report its parent's counts as its own
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _ensure_flusher(self):
+        if self._flusher_pid == os.getpid() or not self.directory:
+            return
+        with self._lock:
+            self._current()
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def _before_request(self):
+        self._ensure_flusher()
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            self._current()
+            self._in_flight[g.metrics_endpoint] = self._in_flight.get(g.metrics_endpoint, 0) + 1
+
+    def _after_request(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = g.metrics_endpoint
+        with self._lock:
+            self._current()
+            key = f'{endpoint}|{request.method}|{response.status_code}'
+            self._requests[key] = self._requests.get(key, 0) + 1
+            histogram = self._latency.setdefault(endpoint, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            for position, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    histogram['buckets'][position] += 1
+            histogram['sum'] += elapsed
+            histogram['count'] += 1
+            self._dirty = True
+        return response
+
+    def _teardown_request(self, error=None):
+        # Runs once the response is returned, or after a stream_with_context
+        # body finishes; other streams are closed out by streamed()
+        endpoint = g.pop('metrics_endpoint', None)
+        if endpoint is None or g.pop('metrics_streaming', False):
+            return
+        self._finished(endpoint)
+
+    def streamed(self, chunks):
+        """Keep the current request in flight until a streamed body is closed.
+
+        For streaming responses that are not wrapped in stream_with_context
+        (the event feed, badge sheets), whose request context ends as soon
+        as the headers are sent.
+        """
+        endpoint = g.get('metrics_endpoint')
+        if endpoint is None:
+            return chunks
+        g.metrics_streaming = True
+        return _TrackedStream(chunks, lambda: self._finished(endpoint))
+
+    def _finished(self, endpoint):
+        with self._lock:
+            self._current()
+            self._in_flight[endpoint] = max(self._in_flight.get(endpoint, 0) - 1, 0)
+            self._dirty = True
+        if time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def scan_outcome(self, outcome, count=1):
+        """Count scan results: present, late, absent, already_marked, not_found, error"""
+        with self._lock:
+            self._current()
+            self._scans[outcome] = self._scans.get(outcome, 0) + count
+            self._dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            self._current()
+            return json.loads(json.dumps({
+                'pid': self._pid,
+                'token': self._token,
+                'requests': self._requests,
+                'latency': self._latency,
+                'in_flight': self._in_flight,
+                'scans': self._scans,
+            }))
+
+    def flush(self):
+        """Write this process's snapshot file"""
+        if not self.directory:
+            return
+        # Cleared first, so counts made while writing mark it dirty again
+        self._dirty = False
+        data = self.snapshot()
+        self._flushed = time.monotonic()
+        try:
+            _write_json(self.directory, f'{data["pid"]}-{data["token"]}.json', data)
+        except OSError:
+            pass
+
+    def _collect(self):
+        """Sum the snapshots of every process (this one taken fresh and persisted)"""
+        self.flush()
+        own = self.snapshot()
+        snapshots = [own]
+        for path in glob.glob(os.path.join(self.directory or '', '*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get('token') != own['token']:
+                snapshots.append(data)
+
+        total = {'requests': {}, 'latency': {}, 'in_flight': {}, 'scans': {}}
+        for data in snapshots:
+            _merge(total, data)
+            if data is own or (data.get('pid') and _pid_alive(data['pid'])):
+                for key, value in data['in_flight'].items():
+                    total['in_flight'][key] = total['in_flight'].get(key, 0) + value
+        return total
+
+    def render(self, gauges=None):
+        """Prometheus text exposition of all processes' metrics.
+
+        ``gauges`` maps extra gauge names to (help, value), for values read
+        at scrape time such as the SMS outbox depth.
+        """
+        total = self._collect()
+        lines = [
+            '# HELP http_request_duration_seconds Time to response headers by endpoint',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for endpoint, histogram in sorted(total['latency'].items()):
+            for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                lines.append(f'http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le="+Inf")} {histogram["count"]}')
+            lines.append(f'http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {histogram["sum"]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{_labels(endpoint=endpoint)} {histogram["count"]}')
+
+        lines += ['# HELP http_requests_total Responses by endpoint, method and status',
+                  '# TYPE http_requests_total counter']
+        for key, count in sorted(total['requests'].items()):
+            endpoint, method, status = key.split('|')
+            lines.append(f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+        lines += ['# HELP http_requests_in_flight Requests currently being served',
+                  '# TYPE http_requests_in_flight gauge']
+        for endpoint, count in sorted(total['in_flight'].items()):
+            lines.append(f'http_requests_in_flight{_labels(endpoint=endpoint)} {count}')
+
+        lines += ['# HELP attendance_scans_total Scan results by outcome',
+                  '# TYPE attendance_scans_total counter']
+        for outcome, count in sorted(total['scans'].items()):
+            lines.append(f'attendance_scans_total{_labels(outcome=outcome)} {count}')
+
+        for name, (help_text, value) in (gauges or {}).items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
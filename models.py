@@ -1,37 +1,76 @@
+import base64
+import json
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from collections import namedtuple
 from datetime import datetime
+from sqlalchemy import and_, case, func, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
-class Admin(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
-    is_admin = db.Column(db.Boolean, default=True)
+# werkzeug method string -> the full parameter prefix it writes into hashes
+_hash_prefixes = {}
+
+
+def password_hash_prefix(method):
+    """The prefix werkzeug stores for a method, e.g. 'pbkdf2' -> 'pbkdf2:sha256:1000000'"""
+    if method not in _hash_prefixes:
+        _hash_prefixes[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return _hash_prefixes[method]
+
+
+class PasswordMixin:
+    """Password hashing with the PASSWORD_HASH_METHOD profile from Config"""
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
+    
+    def needs_rehash(self):
+        """True when the stored hash was made with a different method or cost"""
+        stored = self.password_hash.split('$', 1)[0]
+        return stored != password_hash_prefix(current_app.config['PASSWORD_HASH_METHOD'])
 
-class Staff(UserMixin, db.Model):
+class Admin(PasswordMixin, UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+    is_admin = db.Column(db.Boolean, default=True)
+    
+    def get_id(self):
+        # Typed session id, so the user loader only queries one table
+        return f'admin:{self.id}'
+
+class Staff(PasswordMixin, UserMixin, db.Model):
+    # Staff log in by name; list pages page through (department, name, id)
+    __table_args__ = (
+        db.Index('ix_staff_name', 'name'),
+        db.Index('ix_staff_department_name_id', 'department', 'name', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     department = db.Column(db.String(100), nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     barcode = db.Column(db.String(50), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-    
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+    def get_id(self):
+        return f'staff:{self.id}'
 
 class Student(db.Model):
+    # List pages page through (department, name, id)
+    __table_args__ = (
+        db.Index('ix_student_department_name_id', 'department', 'name', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     reg_no = db.Column(db.String(50), unique=True, nullable=False)
@@ -44,17 +83,17 @@ class Student(db.Model):
     attendance_records = db.relationship('Attendance', backref='student', lazy=True)
     
     def get_attendance_percentage(self):
-        total_days = Attendance.query.filter_by(student_id=self.id).count()
-        if total_days == 0:
-            return 0
-        # Use SQLAlchemy's in_ operator to check for multiple statuses
-        present_days = Attendance.query.filter(
-            Attendance.student_id == self.id,
-            Attendance.status.in_(['present', 'late'])
-        ).count()
-        return round((present_days / total_days) * 100, 2)
+        total_days, present_days = attendance_counts([self.id]).get(self.id, (0, 0))
+        return attendance_percentage(total_days, present_days)
 
 class Attendance(db.Model):
+    # One mark per student per day, enforced by the database; the unique
+    # index also serves per-student history lookups
+    __table_args__ = (
+        db.Index('uq_attendance_student_date', 'student_id', 'date', unique=True),
+        db.Index('ix_attendance_date_status', 'date', 'status'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     # Use callables so defaults are evaluated at instance creation time
@@ -65,6 +104,13 @@ class Attendance(db.Model):
     
 # Add this class at the end of models.py file
 class StaffAttendance(db.Model):
+    # One mark per staff member per day, enforced by the database; the unique
+    # index also serves per-staff history lookups
+    __table_args__ = (
+        db.Index('uq_staff_attendance_staff_date', 'staff_id', 'date', unique=True),
+        db.Index('ix_staff_attendance_date_status', 'date', 'status'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
     date = db.Column(db.Date, default=lambda: datetime.now().date())
@@ -78,3 +124,492 @@ class StaffAttendance(db.Model):
     def __repr__(self):
         return f'<StaffAttendance {self.staff.name} - {self.date}>'
 
+
+class DailyAttendanceSummary(db.Model):
+    """Per-day attendance counters, kept current by the scan routes"""
+    __table_args__ = (
+        db.Index('uq_daily_summary_date_type_department', 'date', 'person_type', 'department', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)
+    person_type = db.Column(db.String(10), nullable=False)  # student, staff
+    department = db.Column(db.String(100), nullable=False)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    marked = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyAttendanceSummary {self.date} {self.person_type} {self.department}>'
+
+
+class SmsOutbox(db.Model):
+    """Outgoing SMS waiting to be sent by the dispatcher (see sms.py)"""
+    __table_args__ = (
+        db.Index('ix_sms_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    phone = db.Column(db.String(15), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Same phone + body + day hashes to the same key, so exact repeats are skipped
+    dedup_key = db.Column(db.String(40), unique=True, nullable=False)
+    claim_token = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<SmsOutbox {self.phone} - {self.status}>'
+
+
+class BarcodeSequence(db.Model):
+    """Next unissued barcode sequence number (see barcodes.py)"""
+    name = db.Column(db.String(20), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False)
+    
+    def __repr__(self):
+        return f'<BarcodeSequence {self.name} - {self.next_value}>'
+
+
+def attendance_percentage(total_days, present_days):
+    """Share of recorded days marked present or late, as a percentage"""
+    if total_days == 0:
+        return 0
+    return round((present_days / total_days) * 100, 2)
+
+
+def _student_attendance_totals():
+    """GROUP BY student_id -> total days and days marked present/late"""
+    return db.session.query(
+        Attendance.student_id.label('student_id'),
+        func.count(Attendance.id).label('total_days'),
+        func.sum(case((Attendance.status.in_(['present', 'late']), 1), else_=0)).label('present_days')
+    ).group_by(Attendance.student_id)
+
+
+def attendance_counts(student_ids=None):
+    """Return {student_id: (total_days, present_days)} from one aggregate query"""
+    query = _student_attendance_totals()
+    if student_ids is not None:
+        query = query.filter(Attendance.student_id.in_(student_ids))
+    return {row.student_id: (row.total_days, row.present_days or 0) for row in query}
+
+
+def _supports_window_functions():
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return True
+    # ROW_NUMBER() OVER arrived in SQLite 3.25
+    return bind.dialect.dbapi.sqlite_version_info >= (3, 25)
+
+
+def recent_staff_attendance(limit=30):
+    """Every staff member with their latest ``limit`` attendance rows.
+
+    Uses ROW_NUMBER() OVER (PARTITION BY staff_id ORDER BY date DESC) so the
+    whole page is one query; older SQLite ranks rows with a correlated count
+    instead. Returns a list of (Staff, [StaffAttendance, newest first]).
+    """
+    if _supports_window_functions():
+        ranked = select(
+            StaffAttendance,
+            func.row_number().over(
+                partition_by=StaffAttendance.staff_id,
+                order_by=StaffAttendance.date.desc()
+            ).label('row_number')
+        ).subquery()
+        recent = aliased(StaffAttendance, ranked)
+        in_window = ranked.c.row_number <= limit
+    else:
+        recent = aliased(StaffAttendance)
+        newer = aliased(StaffAttendance)
+        in_window = select(func.count(newer.id)).where(
+            newer.staff_id == recent.staff_id, newer.date > recent.date
+        ).scalar_subquery() < limit
+    
+    rows = db.session.query(Staff, recent).outerjoin(
+        recent, and_(recent.staff_id == Staff.id, in_window)
+    ).order_by(Staff.id, recent.date.desc())
+    
+    result = []
+    for staff, record in rows:
+        if not result or result[-1][0] is not staff:
+            result.append((staff, []))
+        if record is not None:
+            result[-1][1].append(record)
+    return result
+
+
+# One page of a keyset-paginated list plus cursors for its neighbours
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a page cursor; raises ValueError if it was tampered with"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+    # (department, name, id); anything else would reach the database as a bind parameter
+    if (not isinstance(values, list) or len(values) != 3
+            or not all(isinstance(value, str) for value in values[:2])
+            or not isinstance(values[2], int) or isinstance(values[2], bool)):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def keyset_page(query, model, after=None, before=None, page_size=50):
+    """Page a Student or Staff query by (department, name, id).
+
+    Instead of OFFSET, each page starts strictly after (or, going back,
+    before) the key of the row that ended the neighbouring page, so with the
+    matching index every page costs the same as the first.
+    """
+    columns = (model.department, model.name, model.id)
+    key = tuple_(*columns)
+    
+    if before:
+        query = query.filter(key < tuple(decode_cursor(before))).order_by(*[column.desc() for column in columns])
+    else:
+        if after:
+            query = query.filter(key > tuple(decode_cursor(after)))
+        query = query.order_by(*columns)
+    
+    rows = query.limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before:
+        rows.reverse()
+    if not rows:
+        return KeysetPage([], None, None)
+    
+    first = encode_cursor([rows[0].department, rows[0].name, rows[0].id])
+    last = encode_cursor([rows[-1].department, rows[-1].name, rows[-1].id])
+    if before:
+        return KeysetPage(rows, last, first if has_more else None)
+    return KeysetPage(rows, last if has_more else None, first if after else None)
+
+
+def unmarked_today(person_type, date, department=None):
+    """Query for students or staff with no attendance row for ``date``.
+
+    The anti-join (NOT EXISTS) runs in the database, so callers can page,
+    count or stream the result without loading everyone. Ordered by name.
+    """
+    person_model = Student if person_type == 'student' else Staff
+    attendance_model = Attendance if person_type == 'student' else StaffAttendance
+    marked = select(attendance_model.id).where(
+        person_column(attendance_model) == person_model.id,
+        attendance_model.date == date
+    ).exists()
+    
+    query = person_model.query.filter(~marked)
+    if department:
+        query = query.filter(person_model.department == department)
+    return query.order_by(person_model.name, person_model.id)
+
+
+SUMMARY_COUNTERS = ('present', 'late', 'absent', 'marked')
+
+
+def record_daily_marks(marks):
+    """Add newly inserted attendance marks to DailyAttendanceSummary.
+
+    ``marks`` is an iterable of (date, person_type, department, status). Runs
+    one upsert per summary row touched, inside the caller's transaction so the
+    counters commit (or roll back) together with the attendance rows.
+    """
+    counts = {}
+    for date, person_type, department, status in marks:
+        row = counts.setdefault((date, person_type, department), dict.fromkeys(SUMMARY_COUNTERS, 0))
+        if status in row:
+            row[status] += 1
+        row['marked'] += 1
+    if not counts:
+        return
+    
+    rows = [
+        {'date': date, 'person_type': person_type, 'department': department, **counters}
+        for (date, person_type, department), counters in counts.items()
+    ]
+    summary = DailyAttendanceSummary
+    
+    dialect_insert = _upsert_dialect()
+    if dialect_insert is not None:
+        for row in rows:
+            stmt = dialect_insert(summary).values(**row)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['date', 'person_type', 'department'],
+                set_={name: getattr(summary, name) + getattr(stmt.excluded, name) for name in SUMMARY_COUNTERS}
+            )
+            db.session.execute(stmt)
+        return
+    
+    for row in rows:
+        key = (summary.date == row['date'], summary.person_type == row['person_type'],
+               summary.department == row['department'])
+        result = db.session.execute(db.update(summary).where(*key).values(
+            {name: getattr(summary, name) + row[name] for name in SUMMARY_COUNTERS}
+        ))
+        if result.rowcount == 0:
+            db.session.execute(db.insert(summary).values(**row))
+
+
+def daily_summary(date):
+    """Totals for one day: {'student': {present, late, absent, marked}, 'staff': {...}}"""
+    summary = DailyAttendanceSummary
+    totals = {person_type: dict.fromkeys(SUMMARY_COUNTERS, 0) for person_type in ('student', 'staff')}
+    rows = db.session.query(
+        summary.person_type, *[func.sum(getattr(summary, name)) for name in SUMMARY_COUNTERS]
+    ).filter(summary.date == date).group_by(summary.person_type)
+    for person_type, *values in rows:
+        totals[person_type] = {name: value or 0 for name, value in zip(SUMMARY_COUNTERS, values)}
+    return totals
+
+
+def rebuild_daily_summary(date_from, date_to):
+    """Recompute DailyAttendanceSummary for a date range from the attendance tables"""
+    summary = DailyAttendanceSummary
+    db.session.execute(db.delete(summary).where(summary.date >= date_from, summary.date <= date_to))
+    
+    sources = (
+        ('student', Attendance, Student, Attendance.student_id),
+        ('staff', StaffAttendance, Staff, StaffAttendance.staff_id),
+    )
+    for person_type, attendance_model, person_model, column in sources:
+        counters = [
+            func.sum(case((attendance_model.status == status, 1), else_=0))
+            for status in ('present', 'late', 'absent')
+        ]
+        aggregate = select(
+            attendance_model.date, db.literal(person_type), person_model.department,
+            *counters, func.count(attendance_model.id)
+        ).join(person_model, column == person_model.id).where(
+            attendance_model.date >= date_from, attendance_model.date <= date_to
+        ).group_by(attendance_model.date, person_model.department)
+        db.session.execute(db.insert(summary).from_select(
+            ['date', 'person_type', 'department', *SUMMARY_COUNTERS], aggregate
+        ))
+    db.session.commit()
+
+
+# What mark_attendance returns when the database cannot RETURN the row
+MarkedRow = namedtuple('MarkedRow', ['id', 'time', 'status'])
+
+
+def person_column(attendance_model):
+    """The foreign key column identifying who an attendance row belongs to"""
+    return attendance_model.student_id if attendance_model is Attendance else attendance_model.staff_id
+
+
+def _upsert_dialect():
+    """The dialect-specific insert() supporting ON CONFLICT, or None"""
+    dialect = db.session.get_bind().dialect
+    if dialect.name == 'sqlite' and dialect.insert_returning:
+        return sqlite.insert
+    if dialect.name == 'postgresql':
+        return postgresql.insert
+    return None
+
+
+def mark_attendance(attendance_model, person_id, date, time, status):
+    """Record a person's attendance for a date unless it is already recorded.
+
+    Runs INSERT ... ON CONFLICT DO NOTHING ... RETURNING, so the database
+    itself says whether the row was created: a returned row is ours, while
+    an empty result means (person, date) was already taken and that row is
+    read back. Comparing values instead would call two scans with the same
+    timestamp both "created". Returns ``(row, created)`` where row has
+    ``id``, ``time`` and ``status``. The caller commits.
+    """
+    column = person_column(attendance_model)
+    values = {column.key: person_id, 'date': date, 'time': time, 'status': status}
+    returning = (attendance_model.id, attendance_model.time, attendance_model.status)
+    existing = select(*returning).where(column == person_id, attendance_model.date == date)
+    
+    dialect_insert = _upsert_dialect()
+    if dialect_insert is not None:
+        stmt = dialect_insert(attendance_model).values(**values).on_conflict_do_nothing(
+            index_elements=[column.key, 'date']
+        ).returning(*returning)
+        row = db.session.execute(stmt).one_or_none()
+        if row is not None:
+            return row, True
+        return db.session.execute(existing).one(), False
+    
+    # Portable fallback: let the unique index reject the duplicate
+    try:
+        with db.session.begin_nested():
+            result = db.session.execute(db.insert(attendance_model).values(**values))
+        return MarkedRow(result.inserted_primary_key[0], time, status), True
+    except IntegrityError:
+        return db.session.execute(existing).one(), False
+
+
+def insert_ignoring_conflicts(model, rows, conflict_columns, returning):
+    """Bulk insert rows, silently skipping those that hit a unique index.
+
+    ``conflict_columns`` names the unique index to check. Returns the values
+    of the ``returning`` columns for the rows that were actually inserted.
+    """
+    if not rows:
+        return []
+    
+    dialect_insert = _upsert_dialect()
+    if dialect_insert is not None:
+        stmt = dialect_insert(model).values(rows).on_conflict_do_nothing(
+            index_elements=conflict_columns
+        ).returning(*returning)
+        return [tuple(row) for row in db.session.execute(stmt)]
+    
+    inserted = []
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(model).values(**row))
+            inserted.append(tuple(row[column.key] for column in returning))
+        except IntegrityError:
+            pass
+    return inserted
+
+
+def insert_attendance_rows(attendance_model, rows):
+    """Bulk insert attendance rows, skipping any (person, date) already taken.
+
+    Returns the set of (person_id, date) pairs that were actually inserted, so
+    callers can tell which rows lost a race with another worker.
+    """
+    column = person_column(attendance_model)
+    return set(insert_ignoring_conflicts(
+        attendance_model, rows, [column.key, 'date'], [column, attendance_model.date]
+    ))
+
+
+def missing_indexes():
+    """Indexes declared on the models that the database does not have yet"""
+    inspector = db.inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)} if table.name in tables else set()
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def narrow_columns():
+    """String columns the database stores narrower than the models declare"""
+    inspector = db.inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    narrow = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            length = getattr(column.type, 'length', None)
+            current = getattr(existing.get(column.name), 'length', None)
+            if length and current and current < length:
+                narrow.append(column)
+    return narrow
+
+
+# What upgrade_schema changed (or, with dry_run, would change)
+SchemaUpgrade = namedtuple('SchemaUpgrade', ['changed', 'duplicates_removed', 'summary_rebuilt'])
+
+
+def _duplicate_attendance(attendance_model):
+    """Condition matching every attendance row but the earliest for its (person, date)"""
+    keep = select(func.min(attendance_model.id)).group_by(person_column(attendance_model), attendance_model.date)
+    return attendance_model.id.not_in(keep)
+
+
+def attendance_date_range():
+    """(earliest, latest) attendance date across students and staff, or None when empty"""
+    dates = [
+        db.session.query(func.min(model.date), func.max(model.date)).one()
+        for model in (Attendance, StaffAttendance)
+    ]
+    earliest = [first for first, _ in dates if first is not None]
+    latest = [last for _, last in dates if last is not None]
+    if not earliest:
+        return None
+    return min(earliest), max(latest)
+
+
+def upgrade_schema(dry_run=False):
+    """Bring an existing database up to the current models.
+
+    ``db.create_all()`` only creates missing tables, so this also creates any
+    index declared on the models that the database does not have yet, and
+    widens string columns that have grown (e.g. password_hash for longer
+    hash profiles; SQLite does not enforce lengths, so it is skipped there).
+    Before a unique (person, date) index is added, duplicate attendance rows
+    are removed (keeping the earliest). DailyAttendanceSummary is rebuilt
+    from the attendance tables when it is empty or duplicates were removed,
+    so the dashboards do not start from zero. Statistics are refreshed with
+    ANALYZE afterwards so the planner starts using the new indexes. Returns a
+    SchemaUpgrade with the index and column names, the duplicate rows deleted
+    per table and whether the summary was rebuilt (with dry_run, what would be).
+    """
+    dialect = db.engine.dialect.name
+    narrow = narrow_columns() if dialect != 'sqlite' else []
+    missing = missing_indexes()
+    inspector = db.inspect(db.engine)
+    # A new or never-filled summary table would show zero on every dashboard
+    summary_empty = (
+        not inspector.has_table(DailyAttendanceSummary.__tablename__)
+        or db.session.query(DailyAttendanceSummary.date).first() is None
+    )
+    
+    deduplicate = [
+        Attendance if index.table.name == Attendance.__tablename__ else StaffAttendance
+        for index in missing
+        if index.unique and index.table.name in (Attendance.__tablename__, StaffAttendance.__tablename__)
+        and inspector.has_table(index.table.name)
+    ]
+    duplicates = {
+        model.__tablename__: db.session.query(func.count(model.id)).filter(_duplicate_attendance(model)).scalar()
+        for model in deduplicate
+    }
+    rebuild_summary = summary_empty or any(duplicates.values())
+    if dry_run:
+        changed = [index.name for index in missing] + [f'{column.table.name}.{column.name}' for column in narrow]
+        return SchemaUpgrade(changed, duplicates, rebuild_summary and attendance_date_range() is not None)
+    
+    db.create_all()
+    # create_all() built indexes for brand new tables along with them
+    missing = missing_indexes()
+    
+    for column in narrow:
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        if dialect == 'mysql':
+            ddl = f'ALTER TABLE {column.table.name} MODIFY {column.name} {column_type}'
+        else:
+            ddl = f'ALTER TABLE {column.table.name} ALTER COLUMN {column.name} TYPE {column_type}'
+        db.session.execute(db.text(ddl))
+    
+    for model in deduplicate:
+        result = db.session.execute(db.delete(model).where(_duplicate_attendance(model)))
+        duplicates[model.__tablename__] = result.rowcount
+    db.session.commit()
+    
+    for index in missing:
+        index.create(db.engine)
+    changed = [index.name for index in missing] + [f'{column.table.name}.{column.name}' for column in narrow]
+    
+    date_range = attendance_date_range() if rebuild_summary else None
+    if date_range:
+        rebuild_daily_summary(*date_range)
+    if missing or date_range:
+        with db.engine.begin() as connection:
+            connection.execute(db.text('ANALYZE'))
+    return SchemaUpgrade(changed, duplicates, date_range is not None)
@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import qrcode
+
+
+# Bump when the rendering code changes so stale cache files are not served
+RENDER_VERSION = 1
+
+logger = logging.getLogger('attendance.qr')
+
+
+class QRCache:
+    """Content-addressed cache of rendered QR code PNGs.
+
+    Images are keyed by a hash of the data and every render parameter, kept
+    on disk (shared by all workers) with a small in-memory LRU in front. The
+    key doubles as the HTTP ETag.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.memory_items = 256
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.get('QR_CACHE_DIR') or os.path.join(app.instance_path, 'qr_cache')
+        self.memory_items = app.config.get('QR_CACHE_MEMORY_ITEMS', 256)
+
+    @staticmethod
+    def key(data, box_size=10, border=5, fill_color='black', back_color='white'):
+        params = f'{RENDER_VERSION}|{box_size}|{border}|{fill_color}|{back_color}|{data}'
+        return hashlib.sha256(params.encode()).hexdigest()
+
+    @staticmethod
+    def render(data, box_size=10, border=5, fill_color='black', back_color='white'):
+        """Render a QR code to PNG bytes"""
+        qr = qrcode.QRCode(version=1, box_size=box_size, border=border)
+        qr.add_data(data)
+        qr.make(fit=True)
+
+        img = qr.make_image(fill_color=fill_color, back_color=back_color)
+        buffer = BytesIO()
+        img.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.png')
+
+    def _remember(self, key, png):
+        with self._lock:
+            self._memory[key] = png
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get_png(self, data, **params):
+        """Return ``(key, png_bytes)``, rendering only on a cache miss"""
+        key = self.key(data, **params)
+
+        with self._lock:
+            png = self._memory.get(key)
+            if png is not None:
+                self._memory.move_to_end(key)
+                return key, png
+
+        path = self._path(key) if self.directory else None
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                png = f.read()
+        else:
+            png = self.render(data, **params)
+            if path:
+                self._write(path, png)
+
+        self._remember(key, png)
+        return key, png
+
+    def _write(self, path, png):
+        # Write to a temp file and rename so readers never see a partial image
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write QR cache file %s: %s", path, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
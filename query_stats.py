@@ -0,0 +1,84 @@
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import db
+
+
+class QueryStats:
+    """Count SQL statements and database time for each request.
+
+    Every statement run while a request is active is counted in ``g``. With
+    DB_TIMING_HEADERS (on by default in debug mode) responses carry
+    ``X-DB-Queries`` and a ``Server-Timing: db`` entry, which browser dev
+    tools show next to the request.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+        app.after_request(self._add_headers)
+
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('query_started')
+        if not started or not has_request_context():
+            return
+        elapsed = time.perf_counter() - started.pop()
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_time = g.get('db_time', 0.0) + elapsed
+
+    def _add_headers(self, response):
+        enabled = self.app.config.get('DB_TIMING_HEADERS')
+        if enabled is None:
+            enabled = self.app.debug
+        if enabled:
+            queries = g.get('db_queries', 0)
+            response.headers['X-DB-Queries'] = str(queries)
+            response.headers.add('Server-Timing', f'db;dur={g.get("db_time", 0.0) * 1000:.1f};desc="{queries} queries"')
+        return response
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries, label='block'):
+    """Fail when the enclosed code runs more than ``max_queries`` statements.
+
+    Used by the checks to catch N+1 regressions::
+
+        with app.app_context(), query_budget(5, '/all_students'):
+            client.get('/all_students')
+
+    Yields the list of statements seen so far. Needs an app context.
+    """
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    if len(statements) > max_queries:
+        listing = '\n'.join(f'  {n}. {" ".join(s.split())[:200]}' for n, s in enumerate(statements, start=1))
+        raise QueryBudgetExceeded(f'{label} ran {len(statements)} queries, budget is {max_queries}:\n{listing}')
@@ -1,24 +1,104 @@
-from app import app
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# The checks write people and attendance, so they never touch the configured database
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='attendance-checks-'), 'checks.db')
+# Late/absent scans always queue an SMS, and no drain thread runs queries during a budget
+os.environ['SMS_TRANSPORT'] = 'stub'
+os.environ['SMS_WORKERS'] = '0'
+
+from app import app, barcode_allocator
+from models import db, Admin, Staff, Student, Attendance, StaffAttendance, rebuild_daily_summary
+from query_stats import query_budget, QueryBudgetExceeded
+
+# Statements each check runs with CHECK_STUDENTS / CHECK_STAFF rows, so an N+1
+# shows up here; raise deliberately. The logged-in user is already cached by
+# then, and the scan budget covers a late/absent mark queuing a parent SMS.
+QUERY_BUDGETS = {
+    '/': 0,
+    '/login': 0,
+    '/all_students': 2,
+    '/staff_dashboard': 1,
+    '/staff_attendance': 1,
+    '/todays_students': 4,
+    '/scan_barcode': 4,
+}
+CHECK_STUDENTS = 12
+CHECK_STAFF = 4
+CHECK_DAYS = 5
+
+def seed_check_data():
+    """An admin plus a few students and staff with some days of attendance"""
+    db.create_all()
+    admin = Admin(username='admin')
+    admin.set_password('admin123')
+    db.session.add(admin)
+    barcodes = barcode_allocator.allocate(CHECK_STUDENTS + CHECK_STAFF)
+    students = [
+        Student(name=f'Student {n}', reg_no=f'CHK{n:04d}', department='CSE' if n % 2 else 'ECE',
+                parent_phone='+15550000000', barcode=barcodes[n])
+        for n in range(CHECK_STUDENTS)
+    ]
+    staff = [Staff(name=f'Staff {n}', department='CSE', barcode=barcodes[CHECK_STUDENTS + n]) for n in range(CHECK_STAFF)]
+    for member in staff:
+        member.set_password('staff123')
+    db.session.add_all(students + staff)
+    db.session.flush()
+
+    today = datetime.now().date()
+    for back in range(CHECK_DAYS):
+        day = today - timedelta(days=back)
+        # Leave the last student unmarked today so /scan_barcode has someone to mark
+        for student in students[:-1]:
+            db.session.add(Attendance(student_id=student.id, date=day, time=datetime.now().time(), status='present'))
+        for member in staff:
+            db.session.add(StaffAttendance(staff_id=member.id, date=day, time=datetime.now().time(), status='late'))
+    db.session.commit()
+    rebuild_daily_summary(today - timedelta(days=CHECK_DAYS), today)
+    return students[-1].barcode
+
+def check(label, request, expected_status):
+    with query_budget(QUERY_BUDGETS[label], label) as statements:
+        r = request()
+    print(f' {label} ->', r.status_code, f'({len(statements)} queries)')
+    if r.status_code != expected_status:
+        raise AssertionError(f'{label} returned {r.status_code}, expected {expected_status}')
+    return r
 
 def run_checks():
     print('Creating test client...')
     client = app.test_client()
+    failures = []
+
+    with app.app_context():
+        unmarked_barcode = seed_check_data()
+        try:
+            print('GET /')
+            check('/', lambda: client.get('/'), 302)
+
+            print('GET /login')
+            check('/login', lambda: client.get('/login'), 200)
 
-    print('GET /')
-    r = client.get('/')
-    print(' / ->', r.status_code)
+            print('POST /login (admin)')
+            r = client.post('/login', data={'username': 'admin', 'password': 'admin123', 'user_type': 'admin'})
+            if r.status_code != 302:
+                raise AssertionError(f'admin login returned {r.status_code}')
 
-    print('GET /login')
-    r = client.get('/login')
-    print(' /login ->', r.status_code)
+            for path in ('/all_students', '/staff_dashboard', '/staff_attendance', '/todays_students'):
+                print(f'GET {path}')
+                check(path, lambda: client.get(path), 200)
 
-    print('GET /all_students')
-    r = client.get('/all_students')
-    print(' /all_students ->', r.status_code)
+            print('POST /scan_barcode')
+            r = check('/scan_barcode', lambda: client.post('/scan_barcode', json={'barcode': unmarked_barcode}), 201)
+            print(' /scan_barcode ->', r.get_json())
+        except (QueryBudgetExceeded, AssertionError) as e:
+            failures.append(str(e))
 
-    print('POST /scan_barcode (no data)')
-    r = client.post('/scan_barcode', json={})
-    print(' /scan_barcode ->', r.status_code, r.get_json())
+    for failure in failures:
+        print('[FAIL]', failure)
+    return not failures
 
 if __name__ == '__main__':
-    run_checks()
+    sys.exit(0 if run_checks() else 1)
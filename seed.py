@@ -0,0 +1,115 @@
+import logging
+import random
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, insert
+
+from models import db, Student, Staff, Attendance, StaffAttendance, rebuild_daily_summary
+
+
+FIRST_NAMES = ['Aarav', 'Aditi', 'Arjun', 'Divya', 'Farhan', 'Gauri', 'Ishaan', 'Kavya', 'Meera', 'Nikhil',
+               'Priya', 'Rahul', 'Rohan', 'Sana', 'Tanvi', 'Varun', 'Vikram', 'Zara', 'Anjali', 'Kiran']
+LAST_NAMES = ['Sharma', 'Nair', 'Menon', 'Iyer', 'Patel', 'Reddy', 'Khan', 'Das', 'Pillai', 'Joseph',
+              'Varghese', 'Gupta', 'Rao', 'Thomas', 'Kurian', 'Singh', 'Mathew', 'Bose', 'Verma', 'Jain']
+DEPARTMENTS = ['CSE', 'ECE', 'EEE', 'MECH', 'CIVIL', 'IT']
+# Password of every generated staff account
+STAFF_PASSWORD = 'staff123'
+
+logger = logging.getLogger('attendance.seed')
+
+
+def _arrival(rng):
+    """Time of a morning scan: most people around 9:15, a tail running late"""
+    minutes = max(0, min(int(rng.gauss(9 * 60 + 15, 20)), 12 * 60))
+    return time(minutes // 60, minutes % 60, rng.randrange(60))
+
+
+def _insert_chunked(model, rows, chunk_size, returning=None):
+    """executemany insert, committing per chunk; returns the ``returning`` column values"""
+    values = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        if returning is None:
+            db.session.execute(insert(model), chunk)
+        else:
+            values.extend(db.session.execute(insert(model).returning(returning), chunk).scalars())
+        db.session.commit()
+    return values
+
+
+def seed_people(allocator, students, staff, rng, chunk_size=5000):
+    """Bulk insert synthetic students and staff; returns their new ids"""
+    offset = db.session.query(func.count(Student.id)).scalar()
+    barcodes = allocator.allocate(students + staff)
+
+    rows = []
+    for n in range(students):
+        rows.append({
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'reg_no': f'SEED{offset + n:07d}',
+            'department': rng.choice(DEPARTMENTS),
+            'parent_phone': f'+9198{rng.randrange(10 ** 8):08d}',
+            'barcode': barcodes[n],
+        })
+    student_ids = _insert_chunked(Student, rows, chunk_size, returning=Student.id)
+
+    # Hashing is deliberately slow, so every generated account shares one hash
+    template = Staff()
+    template.set_password(STAFF_PASSWORD)
+    rows = [{
+        'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {n}',
+        'department': rng.choice(DEPARTMENTS),
+        'password_hash': template.password_hash,
+        'barcode': barcodes[students + n],
+    } for n in range(staff)]
+    staff_ids = _insert_chunked(Staff, rows, chunk_size, returning=Staff.id)
+    return student_ids, staff_ids
+
+
+def seed_attendance(attendance_model, person_ids, days, status_for, rng, turnout=0.92, chunk_size=10000):
+    """One mark per person per weekday for the last ``days`` days; returns rows written"""
+    column = 'student_id' if attendance_model is Attendance else 'staff_id'
+    today = date.today()
+    written = 0
+    for back in range(days, 0, -1):
+        day = today - timedelta(days=back)
+        if day.weekday() >= 5:
+            continue
+        rows = []
+        for person_id in person_ids:
+            if rng.random() > turnout:
+                continue
+            scanned = _arrival(rng)
+            rows.append({
+                column: person_id,
+                'date': day,
+                'time': scanned,
+                'status': status_for(scanned),
+                'created_at': datetime.combine(day, scanned),
+            })
+        _insert_chunked(attendance_model, rows, chunk_size)
+        written += len(rows)
+    return written
+
+
+def seed_dataset(allocator, status_for, students=20000, staff=500, days=730, random_seed=42):
+    """Generate a realistic dataset and rebuild the derived tables.
+
+    People get sequence-allocated barcodes; attendance covers weekdays
+    before today (today is left for live scans). ``status_for(time)`` maps
+    a scan time to present/late/absent, normally the app's
+    check_attendance_time. Everything goes in with executemany inserts.
+    """
+    rng = random.Random(random_seed)
+    student_ids, staff_ids = seed_people(allocator, students, staff, rng)
+    logger.info("Inserted %d students and %d staff", len(student_ids), len(staff_ids))
+
+    written = seed_attendance(Attendance, student_ids, days, status_for, rng)
+    logger.info("Inserted %d student attendance rows", written)
+    written = seed_attendance(StaffAttendance, staff_ids, days, status_for, rng, turnout=0.97)
+    logger.info("Inserted %d staff attendance rows", written)
+
+    if days:
+        rebuild_daily_summary(date.today() - timedelta(days=days), date.today())
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
@@ -0,0 +1,305 @@
+import hashlib
+import importlib
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+try:
+    from twilio.rest import Client
+except ImportError:
+    Client = None
+
+from models import db, SmsOutbox, insert_ignoring_conflicts
+
+
+logger = logging.getLogger('attendance.sms')
+
+
+class TwilioTransport:
+    """Send messages through the Twilio REST API"""
+
+    def __init__(self, account_sid, auth_token, from_number):
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+
+    def send(self, phone_number, message):
+        self.client.messages.create(body=message, from_=self.from_number, to=phone_number)
+
+
+class ConsoleTransport:
+    """Log messages instead of sending them (offline environments)"""
+
+    def send(self, phone_number, message):
+        logger.info("SMS to %s: %s", phone_number, message)
+
+
+class StubTransport:
+    """Keep sent messages in memory so tests can inspect them"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, phone_number, message):
+        self.sent.append((phone_number, message))
+
+
+def transport_from_config(config):
+    """Build the transport named by SMS_TRANSPORT.
+
+    ``auto`` uses Twilio when credentials are configured and otherwise
+    disables SMS; ``twilio``, ``console`` and ``stub`` pick a transport
+    explicitly, and ``package.module:ClassName`` loads a custom one.
+    """
+    name = (config.get('SMS_TRANSPORT') or 'auto').strip()
+
+    if name in ('auto', 'twilio'):
+        if Client and config.get('TWILIO_ACCOUNT_SID') and config.get('TWILIO_AUTH_TOKEN'):
+            try:
+                transport = TwilioTransport(
+                    config['TWILIO_ACCOUNT_SID'],
+                    config['TWILIO_AUTH_TOKEN'],
+                    config.get('TWILIO_PHONE_NUMBER')
+                )
+                logger.info("Twilio client initialized")
+                return transport
+            except Exception as e:
+                logger.warning("Twilio initialization failed: %s", e)
+        return None
+    if name == 'console':
+        return ConsoleTransport()
+    if name == 'stub':
+        return StubTransport()
+
+    module_name, _, class_name = name.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def queue_sms(phone_number, message, delay=0):
+    """Add a message to the outbox in the current transaction (caller commits).
+
+    Returns False when the exact same text was already queued for this phone
+    today, in which case nothing is added.
+    """
+    return queue_sms_many([(phone_number, message)], delay=delay)[0]
+
+
+def queue_sms_many(messages, delay=0):
+    """Add (phone, message) pairs to the outbox with one insert (caller commits).
+
+    Returns one flag per pair, False where the same text was already queued
+    for that phone today (earlier in ``messages`` included).
+    """
+    now = datetime.utcnow()
+    keys = [hashlib.sha1(f'{now.date()}|{phone}|{message}'.encode()).hexdigest() for phone, message in messages]
+    rows = {}
+    for key, (phone, message) in zip(keys, messages):
+        rows.setdefault(key, {
+            'phone': phone,
+            'body': message,
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': now + timedelta(seconds=delay),
+            'dedup_key': key,
+            'created_at': now
+        })
+    inserted = {key for _, key in insert_ignoring_conflicts(
+        SmsOutbox, list(rows.values()), ['dedup_key'], [SmsOutbox.id, SmsOutbox.dedup_key]
+    )}
+    queued = []
+    for key in keys:
+        queued.append(key in inserted)
+        inserted.discard(key)
+    return queued
+
+
+def build_digest(messages):
+    """Merge several texts for one phone into a single message.
+
+    Clauses shared by the start or end of every message ("Dear Parent," ...
+    "Please ensure punctuality.") are kept once around the individual parts.
+    """
+    if len(messages) == 1:
+        return messages[0]
+
+    words = [message.split() for message in messages]
+    shortest = min(len(w) for w in words)
+    prefix = 0
+    while prefix < shortest and len({w[prefix] for w in words}) == 1:
+        prefix += 1
+    suffix = 0
+    while suffix < shortest - prefix and len({w[-1 - suffix] for w in words}) == 1:
+        suffix += 1
+    # Only share whole clauses: the prefix ends and the suffix starts at punctuation
+    while prefix and not words[0][prefix - 1].endswith((',', '.')):
+        prefix -= 1
+    while suffix and not words[0][-1 - suffix].endswith('.'):
+        suffix -= 1
+
+    parts = [' '.join(w[prefix:len(w) - suffix]) for w in words]
+    return ' '.join(words[0][:prefix] + [part for part in parts if part] + words[0][len(words[0]) - suffix:])
+
+
+class SmsDispatcher:
+    """Delivers the SmsOutbox from a background thread.
+
+    Scans only insert outbox rows, so the scanner never waits on the SMS
+    provider. Each drain claims a batch of due messages plus any other
+    pending messages for the same phones, merges them into one digest per
+    phone and sends the digests through a bounded thread pool. Failed sends
+    go back to pending with exponential backoff until SMS_MAX_RETRIES is
+    exhausted. Claims carry a lease, so several worker processes can drain
+    the same outbox and a crashed drain is retried once the lease expires.
+    Each worker process starts its drain thread on its first request, so
+    messages still pending from before a restart go out without a new scan.
+    """
+
+    def __init__(self, app=None):
+        self.transport = None
+        self.app = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.transport = transport_from_config(app.config)
+        self.workers = app.config.get('SMS_WORKERS', 2)
+        self.batch_size = app.config.get('SMS_BATCH_SIZE', 100)
+        self.max_retries = app.config.get('SMS_MAX_RETRIES', 3)
+        self.backoff = app.config.get('SMS_RETRY_BACKOFF', 2.0)
+        self.digest_window = app.config.get('SMS_DIGEST_WINDOW', 60)
+        self.poll_interval = app.config.get('SMS_POLL_INTERVAL', 5.0)
+        self.lease = app.config.get('SMS_CLAIM_LEASE', 120)
+        # Outbox rows left over from a restart must not wait for the next scan
+        app.before_request(self._start_for_request)
+
+    def queue(self, phone_number, message):
+        """Add a message to the outbox; returns False if it was not queued"""
+        return self.queue_many([(phone_number, message)])[0]
+
+    def queue_many(self, messages):
+        """Add (phone, message) pairs in one insert; returns a queued flag per pair"""
+        if self.transport is None:
+            logger.debug("SMS skipped: no SMS transport configured")
+            return [False] * len(messages)
+        if not messages:
+            return []
+        # Held back for the digest window so later texts to this phone merge in
+        return queue_sms_many(messages, delay=self.digest_window)
+
+    def start(self):
+        """Start this process's drain thread if SMS delivery is enabled (idempotent)"""
+        if self.transport is None or not self.workers:
+            return False
+        self._ensure_started()
+        return True
+
+    def _start_for_request(self):
+        self.start()
+
+    def notify(self):
+        """Wake the background drain after queued messages were committed"""
+        if self.start():
+            self._wake.set()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name='sms-drain', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _send_pool(self):
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=max(self.workers, 1), thread_name_prefix='sms-send')
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.drain_all()
+            except Exception:
+                logger.exception("SMS drain failed")
+
+    def pending_count(self):
+        return SmsOutbox.query.filter(SmsOutbox.status.in_(['pending', 'sending'])).count()
+
+    def drain_all(self):
+        """Drain until nothing is due; returns the number of digests sent"""
+        total = 0
+        while True:
+            claimed, sent = self.drain()
+            total += sent
+            if not claimed:
+                return total
+
+    def drain(self, now=None):
+        """Claim and send one batch. Returns (messages claimed, digests sent)."""
+        now = now or datetime.utcnow()
+        token = uuid.uuid4().hex
+
+        due = (
+            SmsOutbox.status.in_(['pending', 'sending']) & (SmsOutbox.next_attempt_at <= now)
+        )
+        due_phones = select(SmsOutbox.phone).where(due).order_by(SmsOutbox.next_attempt_at).limit(self.batch_size)
+        claimable = (SmsOutbox.status == 'pending') | due
+        db.session.execute(
+            update(SmsOutbox)
+            .where(claimable, SmsOutbox.phone.in_(due_phones))
+            .values(status='sending', claim_token=token, next_attempt_at=now + timedelta(seconds=self.lease))
+        )
+        db.session.commit()
+
+        rows = SmsOutbox.query.filter_by(claim_token=token).order_by(SmsOutbox.created_at, SmsOutbox.id).all()
+        if not rows:
+            return 0, 0
+
+        by_phone = {}
+        for row in rows:
+            by_phone.setdefault(row.phone, []).append(row)
+
+        pool = self._send_pool()
+        futures = {
+            phone: pool.submit(self.transport.send, phone, build_digest([row.body for row in group]))
+            for phone, group in by_phone.items()
+        }
+
+        sent = 0
+        for phone, future in futures.items():
+            group = by_phone[phone]
+            ids = [row.id for row in group]
+            attempts = max(row.attempts for row in group) + 1
+            try:
+                future.result()
+            except Exception as e:
+                if attempts > self.max_retries:
+                    logger.error("SMS failed, giving up", extra={'phone': phone, 'attempts': attempts, 'error': str(e)})
+                    values = {'status': 'failed'}
+                else:
+                    delay = self.backoff * (2 ** (attempts - 1))
+                    logger.warning("SMS failed, will retry", extra={'phone': phone, 'attempts': attempts, 'retry_in': delay, 'error': str(e)})
+                    values = {'status': 'pending', 'next_attempt_at': datetime.utcnow() + timedelta(seconds=delay)}
+                values.update(attempts=attempts, last_error=str(e), claim_token=None)
+            else:
+                logger.info("SMS sent", extra={'phone': phone, 'messages': len(group)})
+                values = {'status': 'sent', 'attempts': attempts, 'sent_at': datetime.utcnow(), 'claim_token': None}
+                sent += 1
+            db.session.execute(update(SmsOutbox).where(SmsOutbox.id.in_(ids)).values(**values))
+        db.session.commit()
+        return len(rows), sent